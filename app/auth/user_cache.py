@@ -0,0 +1,79 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from ..config import settings
+
+@dataclass(frozen=True)
+class CachedUser:
+    # Slim, immutable snapshot of what the protected routes actually need
+    id: int
+    email: str
+    is_paid: bool
+
+class UserCacheBackend(ABC):
+    # Interface for shared backends (e.g. Redis) in multi-worker deployments
+    @abstractmethod
+    async def get(self, key: str) -> CachedUser | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, user: CachedUser) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+class MemoryUserCache(UserCacheBackend):
+    # Per-process TTL + LRU cache. Other workers only see invalidations after the TTL.
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, CachedUser]] = OrderedDict()
+
+    async def get(self, key: str) -> CachedUser | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    async def set(self, key: str, user: CachedUser) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+user_cache: UserCacheBackend = MemoryUserCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
+
+def set_user_cache_backend(backend: UserCacheBackend):
+    global user_cache
+    user_cache = backend
+
+async def get_cached_user(email: str) -> CachedUser | None:
+    if settings.USER_CACHE_TTL_SECONDS <= 0:
+        return None
+    return await user_cache.get(email)
+
+async def cache_user(user) -> CachedUser:
+    snapshot = CachedUser(id=user.id, email=user.email, is_paid=bool(user.is_paid))
+    if settings.USER_CACHE_TTL_SECONDS > 0:
+        await user_cache.set(user.email, snapshot)
+    return snapshot
+
+async def invalidate_user(email: str):
+    await user_cache.delete(email)
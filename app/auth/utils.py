@@ -1,5 +1,7 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import asyncio
 from jose import jwt, JWTError
 from ..config import settings
 
@@ -16,6 +18,33 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# Argon2 takes tens of ms of CPU per call. Run it on a small dedicated pool
+# (argon2-cffi releases the GIL) so it never blocks the event loop, and shed
+# load instead of queueing without bound during login bursts.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+_hash_in_flight = 0
+
+class PasswordHasherBusy(Exception):
+    pass
+
+async def _run_hasher(func, *args):
+    global _hash_in_flight
+    if _hash_in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        raise PasswordHasherBusy()
+    _hash_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_in_flight -= 1
+
+async def verify_and_update_password(plain_password, hashed_password):
+    # Returns (valid, new_hash). new_hash is set when the stored hash uses
+    # outdated parameters and should be replaced.
+    return await _run_hasher(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hasher(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,134 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from .config import settings
+from .responses import dumps
+
+# Per-tenant feed of small change events (a sale, a product edit) for open
+# screens, served as server-sent events by GET /events. crud publishes after
+# each committed write; every subscriber of that tenant gets the same encoded
+# frame. The in-memory broker only reaches subscribers connected to the same
+# worker: with several workers, plug in a shared backend (Redis pub/sub,
+# Postgres LISTEN/NOTIFY) that delivers to each worker's local subscribers.
+RESYNC = b'data: {"type":"resync"}\n\n'
+HEARTBEAT = b": ping\n\n"
+
+def encode_event(event: dict) -> bytes:
+    return b"data: " + dumps(event) + b"\n\n"
+
+class Subscription:
+    # One open screen. Holds encoded frames until the connection writes them;
+    # a reader that falls too far behind gets a single "resync" instead.
+    __slots__ = ("user_id", "max_pending", "_frames", "_overflowed", "_wakeup", "closed")
+
+    def __init__(self, user_id: int, max_pending: int):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self._frames: deque[bytes] = deque()
+        self._overflowed = False
+        self._wakeup = asyncio.Event()
+        self.closed = False
+
+    def close(self):
+        # The client went away: wake the writer so it can stop
+        self.closed = True
+        self._wakeup.set()
+
+    def put(self, frame: bytes):
+        if self._overflowed:
+            return
+        if len(self._frames) >= self.max_pending:
+            self._frames.clear()
+            self._overflowed = True
+        else:
+            self._frames.append(frame)
+        self._wakeup.set()
+
+    async def next_frames(self, timeout: float) -> list[bytes]:
+        # Pending frames, or [] once `timeout` passes with nothing to send
+        if not self._frames and not self._overflowed and not self.closed:
+            try:
+                # asyncio.timeout, unlike wait_for, doesn't park an extra task per subscriber
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                return []
+        self._wakeup.clear()
+        if self._overflowed:
+            self._overflowed = False
+            return [RESYNC]
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+class ChangeFeedBackend(ABC):
+    @abstractmethod
+    async def subscribe(self, user_id: int) -> Subscription:
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, user_id: int, event: dict) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+class MemoryChangeFeed(ChangeFeedBackend):
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    async def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.max_pending)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        self.published += 1
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return
+        # Encoded once, shared by every subscriber of the tenant
+        frame = encode_event(event)
+        for subscription in subscribers:
+            subscription.put(frame)
+        self.delivered += len(subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "tenants": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+change_feed: ChangeFeedBackend = MemoryChangeFeed(max_pending=settings.CHANGE_FEED_MAX_PENDING)
+
+def set_change_feed_backend(backend: ChangeFeedBackend):
+    global change_feed
+    change_feed = backend
+
+async def subscribe(user_id: int) -> Subscription:
+    return await change_feed.subscribe(user_id)
+
+async def unsubscribe(subscription: Subscription):
+    await change_feed.unsubscribe(subscription)
+
+async def publish(user_id: int, event: dict):
+    await change_feed.publish(user_id, event)
+
+def feed_stats() -> dict:
+    return change_feed.stats()
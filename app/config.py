@@ -9,13 +9,79 @@ class Settings(BaseSettings):
     # Database
     # Default to local SQLite for dev. In prod, this will be overridden by env var.
     DATABASE_URL: str = "sqlite+aiosqlite:///./sales_manager.db"
+
+    # Connection pool (Postgres, and the SQLite read pool)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Tenant shards. DATABASE_URL is shard 0 and also holds the shard directory
+    # and the global tables (users, payments); SHARD_DATABASE_URLS adds shards
+    # 1..N, comma-separated, same dialect. Workers cache a tenant's shard for
+    # SHARD_MAP_CACHE_TTL_SECONDS, which bounds how long a move waits to freeze writes.
+    SHARD_DATABASE_URLS: str = ""
+    SHARD_MAP_CACHE_TTL_SECONDS: float = 5.0
+    SHARD_DIRECTORY_CACHE_SIZE: int = 10000 # tenants whose shard a worker keeps cached
+
+    # Read replicas (optional). READ_DATABASE_URL is a read-only copy of
+    # DATABASE_URL; SHARD_READ_DATABASE_URLS lists one per SHARD_DATABASE_URLS
+    # entry, in the same order (blank = none). Listings and reports read tenant
+    # data from them, except for READ_AFTER_WRITE_SECONDS after the tenant's own
+    # last write, when they read the primary; keep it above the replica lag.
+    READ_DATABASE_URL: str = ""
+    SHARD_READ_DATABASE_URLS: str = ""
+    READ_AFTER_WRITE_SECONDS: float = 5.0
+
+    # SQLite tuning
+    SQLITE_MMAP_SIZE: int = 268435456 # 256 MB
+    SQLITE_CACHE_SIZE: int = -65536 # negative = KiB, i.e. 64 MB
     
     # Security
     # Default secret for dev only. MUST override in prod.
     SECRET_KEY: str = "dev_secret_key_change_me_in_prod_12345"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Authenticated user cache (per worker). Set TTL to 0 to disable.
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    USER_CACHE_MAX_SIZE: int = 10000
+
+    # Shops' local timezone; analytics days/weeks/months are bucketed in it
+    REPORT_TIMEZONE: str = "Asia/Karachi"
+
+    # Report result cache (per worker). Set TTL to 0 to disable.
+    REPORT_CACHE_TTL_SECONDS: float = 30.0
+    REPORT_CACHE_MAX_ENTRIES: int = 10000
+    REPORT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Password hashing pool. Requests beyond workers + queue get a 503.
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
     
+    # Instrumentation (opt-in). Exposes Prometheus text at /metrics.
+    METRICS_ENABLED: bool = False
+    # Dump folded stacks for requests slower than this (0 = profiler off)
+    PROFILE_SLOW_REQUEST_MS: float = 0
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+    PROFILE_OUTPUT_DIR: str = "profiles"
+    # Warn when import + startup + first request exceeds this (0 = no budget)
+    STARTUP_BUDGET_SECONDS: float = 0
+
+    # Payment callbacks are queued and applied by a background worker per process
+    PAYMENT_WORKER_ENABLED: bool = True
+    PAYMENT_WORKER_BATCH_SIZE: int = 100
+    PAYMENT_WORKER_POLL_SECONDS: float = 2.0
+
+    # Live change feed (GET /events). A subscriber more than MAX_PENDING events
+    # behind is told to resync; heartbeats keep idle connections open through proxies.
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    CHANGE_FEED_MAX_PENDING: int = 100
+    # Lifetime of the token a page opens /events with; it is only checked on connect
+    EVENTS_TOKEN_EXPIRE_SECONDS: int = 60
+
     # Payment Guard
     # Set to True in Prod to enforce payment check
     PAYMENT_REQUIRED: bool = False
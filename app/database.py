@@ -1,27 +1,222 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.sql.util import find_tables
+from dataclasses import dataclass
+import time
 
 from .config import settings
 
 # SQLite for Dev, easily swappable for Postgres via Env Var
 DATABASE_URL = settings.DATABASE_URL
 
-# SQLAlchemy engine configuration
-if DATABASE_URL.startswith("sqlite"):
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Queue pool that records how long checkouts wait, for sizing pools and workers
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def stats(self):
+        capacity = self.size() + max(self._max_overflow, 0)
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "saturation": self.checkedout() / capacity if capacity else 0.0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+def _sqlite_pragmas(read_only: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # WAL lets the read pool keep reading while the writer commits
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+        cursor.close()
+    return on_connect
+
+def _create_engines(url: str):
+    # (engine, read_engine) for one database
+    if url.startswith("sqlite") and ":memory:" in url:
+        engine = create_async_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool # In-memory DB only lives as long as its single connection
+        )
+        return engine, engine
+    if url.startswith("sqlite"):
+        # SQLite allows one writer at a time, so writes queue on a single pooled
+        # connection instead of spinning on busy_timeout. Reads get their own
+        # read-only pool, which WAL lets run alongside the writer.
+        engine = create_async_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            poolclass=TimedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=settings.DB_POOL_TIMEOUT
+        )
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas(read_only=False))
+        return engine, _sqlite_read_engine(url)
+
+    engine = _server_engine(url)
+    return engine, engine
+
+def _sqlite_read_engine(url: str):
+    sqlite_url = make_url(url)
+    read_engine = create_async_engine(
+        sqlite_url.set(database=f"file:{sqlite_url.database}", query={**sqlite_url.query, "mode": "ro", "uri": "true"}),
+        connect_args={"check_same_thread": False, "timeout": 30},
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT
+    )
+    event.listen(read_engine.sync_engine, "connect", _sqlite_pragmas(read_only=True))
+    return read_engine
+
+def _server_engine(url: str):
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        # 0 is required behind pgbouncer in transaction mode
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
     engine = create_async_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}, 
-        poolclass=StaticPool # Needed for simple file-based sqlite in async
+        url,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE
     )
-else:
-    engine = create_async_engine(DATABASE_URL)
+    return engine
+
+def _create_replica_engine(url: str):
+    # A read-only copy of a shard; its own pool, so reports don't queue with writes
+    if url.startswith("sqlite"):
+        return _sqlite_read_engine(url)
+    return _server_engine(url)
+
+# Tenant shards: each tenant's products, sales and rollups live on one shard,
+# with its own engines and pools. Shard 0 (DATABASE_URL) also holds the global
+# tables and the directory of which tenant is where (app.shards).
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    url: str
+    engine: AsyncEngine
+    read_engine: AsyncEngine
+    replica_engine: AsyncEngine | None = None
+
+SHARD_URLS = [DATABASE_URL] + [url.strip() for url in settings.SHARD_DATABASE_URLS.split(",") if url.strip()]
+REPLICA_URLS = [settings.READ_DATABASE_URL.strip()] + [url.strip() for url in settings.SHARD_READ_DATABASE_URLS.split(",")]
+shards = [
+    Shard(index, url, *_create_engines(url), _create_replica_engine(replica) if replica else None)
+    for index, (url, replica) in enumerate(zip(SHARD_URLS, REPLICA_URLS + [""] * len(SHARD_URLS)))
+]
+engine, read_engine = shards[0].engine, shards[0].read_engine
+
+# Ids in tenant tables come from a range per shard, so a tenant keeps its ids
+# when it moves (see crud._assign_ids and app.migrate)
+SHARD_ID_SPAN = 2 ** 40
 
-SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+DIRECTORY_TABLES = frozenset({"users", "payments", "payment_callbacks", "tenant_shards"})
+
+class TenantMoving(Exception):
+    # The tenant is being copied to another shard (app.tenant_move): reads
+    # carry on from the old shard, writes are refused until the move is done
+    pass
+
+class ShardRoutingSession(Session):
+    # Global tables go to shard 0, everything else to the shard bound with
+    # bind_tenant() (shard 0 until then). Read sessions use the read engines,
+    # or the shard's replica once use_replica() allows it; global tables are
+    # never read from a replica, so logins and the directory see no lag.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        if bind is not None:
+            return bind
+        if mapper is not None:
+            tables = {mapper.local_table.name}
+        else:
+            tables = {table.name for table in find_tables(clause, include_crud=True)} if clause is not None else set()
+        read = self.info.get("read", False)
+        if tables and tables <= DIRECTORY_TABLES:
+            shard = shards[0]
+        else:
+            if self.info.get("frozen") and not read:
+                raise TenantMoving()
+            shard = shards[self.info.get("shard", 0)]
+            if read and self.info.get("replica") and shard.replica_engine is not None:
+                return shard.replica_engine.sync_engine
+        return (shard.read_engine if read else shard.engine).sync_engine
+
+def bind_tenant(session: AsyncSession, shard: int, frozen: bool = False):
+    # Point a session's tenant tables at a shard; `frozen` refuses writes
+    session.info["shard"] = shard
+    session.info["frozen"] = frozen
+
+def use_replica(session: AsyncSession, allowed: bool = True):
+    # Let a read session take tenant data from the shard's replica, if it has one
+    session.info["replica"] = allowed
+
+SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession, sync_session_class=ShardRoutingSession)
+ReadSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=read_engine, class_=AsyncSession, sync_session_class=ShardRoutingSession, info={"read": True})
 
 class Base(DeclarativeBase):
     pass
 
 async def get_db():
+    # Bound to the current user's shard by the auth dependency (same session per request)
     async with SessionLocal() as session:
         yield session
+
+async def get_read_db():
+    # For routes that only read. Never commit on this session.
+    async with ReadSessionLocal() as session:
+        yield session
+
+def all_engines():
+    # Every distinct engine, for warm-up, instrumentation and dispose
+    engines = [e for shard in shards for e in (shard.engine, shard.read_engine, shard.replica_engine) if e is not None]
+    return list({id(e): e for e in engines}.values())
+
+async def dispose_engines():
+    for db_engine in all_engines():
+        await db_engine.dispose()
+
+def pool_stats():
+    stats = {}
+    for shard in shards:
+        name = "primary" if shard.index == 0 else f"shard{shard.index}"
+        if isinstance(shard.engine.pool, TimedQueuePool):
+            stats[name] = shard.engine.pool.stats()
+        if shard.read_engine is not shard.engine and isinstance(shard.read_engine.pool, TimedQueuePool):
+            stats["read" if shard.index == 0 else f"{name}_read"] = shard.read_engine.pool.stats()
+        if shard.replica_engine is not None and isinstance(shard.replica_engine.pool, TimedQueuePool):
+            stats["replica" if shard.index == 0 else f"{name}_replica"] = shard.replica_engine.pool.stats()
+    return stats
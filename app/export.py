@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import zlib
+
+# Encoders for the streaming sales ledger export. Each takes the partitions
+# from crud.stream_sales and yields bytes chunk by chunk, so memory stays at
+# one partition regardless of ledger size. Parquet needs pyarrow (optional).
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+SALE_FIELDS = ["id", "date", "product_id", "product_name", "quantity_sold", "total_amount", "cost", "margin"]
+
+def parquet_available() -> bool:
+    return pa is not None
+
+def _values(row):
+    values = list(row)
+    values[1] = row.date.isoformat()
+    return values
+
+async def encode_text(partitions, fmt: str):
+    if fmt == "csv":
+        yield (",".join(SALE_FIELDS) + "\n").encode()
+    async for rows in partitions:
+        buffer = io.StringIO()
+        if fmt == "csv":
+            csv.writer(buffer).writerows(_values(row) for row in rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(SALE_FIELDS, _values(row)))) + "\n")
+        yield buffer.getvalue().encode()
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands its bytes back on drain(). Keeps its own
+    # position because the Parquet writer records footer offsets via tell().
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+async def encode_parquet(partitions):
+    # One row group per partition
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.timestamp("us")),
+        ("product_id", pa.int64()),
+        ("product_name", pa.string()),
+        ("quantity_sold", pa.int64()),
+        ("total_amount", pa.float64()),
+        ("cost", pa.float64()),
+        ("margin", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    async for rows in partitions:
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+async def gzip_chunks(chunks, level: int = 6):
+    # gzip container (wbits=31) compressed on the fly, chunk by chunk
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,23 +1,91 @@
+import time
+_import_started = time.perf_counter() # before the heavy imports, for the "import" startup phase
+
 from fastapi import FastAPI
-from .database import engine, Base
-from .routers import auth, sales, inventory, payment, reports, frontend
-import asyncio
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .config import settings
+from .database import TenantMoving, all_engines, pool_stats
+from .routers import auth, sales, inventory, payment, reports, dashboard, frontend, events, sync
+from . import metrics, report_cache, payment_worker, change_feed
+from .static_files import static_files
+from sqlalchemy import text
+
+if settings.METRICS_ENABLED:
+    app = FastAPI(title="HisabPro", version="1.0.0", default_response_class=metrics.TimedJSONResponse)
+    metrics.setup_metrics(app, all_engines())
+else:
+    app = FastAPI(title="HisabPro", version="1.0.0")
+
+app.add_middleware(metrics.FirstRequestTimer)
 
-app = FastAPI(title="HisabPro", version="1.0.0")
+@app.exception_handler(TenantMoving)
+async def tenant_moving_handler(request, exc):
+    # Writes during the few seconds a tenant move freezes them; reads still work
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Your data is being moved, please retry shortly"},
+        headers={"Retry-After": "5"},
+    )
 
-# Create tables on startup (for dev simplicity)
+# No DDL or reflection here: the schema is migrated once per deploy by
+# `python -m app.migrate`, before the workers start.
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    start = time.perf_counter()
+    # Open the first connection of each pool now rather than on the first request
+    for db_engine in all_engines():
+        async with db_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    metrics.record_startup("engine_connect", time.perf_counter() - start)
+    frontend.compile_pages()
+    metrics.start_sampler()
+    if settings.PAYMENT_WORKER_ENABLED:
+        payment_worker.worker.start()
+    metrics.record_startup("startup", time.perf_counter() - start)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await payment_worker.worker.stop()
 
 app.include_router(auth.router)
 app.include_router(payment.router)
 app.include_router(inventory.router)
 app.include_router(sales.router)
 app.include_router(reports.router)
+app.include_router(dashboard.router)
+app.include_router(events.router)
+app.include_router(sync.router)
 app.include_router(frontend.router)
+app.mount("/static", static_files, name="static")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to HisabPro API"}
+
+# Pool saturation, cache and subscriber counts and startup timings say a lot
+# about the deployment and its traffic, so they are opt-in like /metrics
+if settings.METRICS_ENABLED:
+    @app.get("/health/pool", include_in_schema=False)
+    def read_pool_stats():
+        # Checkout waits and saturation per pool, used to size WEB_CONCURRENCY
+        return pool_stats()
+
+    @app.get("/health/cache", include_in_schema=False)
+    def read_cache_stats():
+        return report_cache.cache_stats()
+
+    @app.get("/health/events", include_in_schema=False)
+    def read_event_stats():
+        # Open change feed connections on this worker
+        return change_feed.feed_stats()
+
+    @app.get("/health/startup", include_in_schema=False)
+    def read_startup_timings():
+        # Per-phase cold start timings for this worker, against STARTUP_BUDGET_SECONDS
+        return metrics.startup_report()
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def read_metrics():
+        return metrics.render_metrics(pool_stats(), report_cache.cache_stats())
+
+metrics.record_startup("import", time.perf_counter() - _import_started)
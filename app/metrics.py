@@ -0,0 +1,287 @@
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from .config import settings
+
+# Opt-in request instrumentation (METRICS_ENABLED). Everything here is
+# per-process; each gunicorn worker exposes its own /metrics.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {} # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route")
+REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "DB queries issued per request", COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent in DB queries per request")
+SERIALIZE_TIME = Histogram("http_response_serialize_seconds", "JSON response encoding time per request")
+TEMPLATE_RENDER = Histogram("template_render_seconds", "Jinja2 template render time")
+
+@dataclass
+class RequestStats:
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+# DB instrumentation
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    # The start time lives on the statement's execution context, so a query
+    # that raises leaves nothing behind on the (pooled, long-lived) connection
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _observe_query(context)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # Failed statements (constraint violations, lock timeouts) took DB time too
+        if exception_context.execution_context is not None:
+            _observe_query(exception_context.execution_context)
+
+def _observe_query(context):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    del context._query_start
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+# Response / template timing
+def observe_serialize(seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = super().render(content)
+        observe_serialize(time.perf_counter() - start)
+        return body
+
+def observe_template(name: str, seconds: float):
+    if settings.METRICS_ENABLED:
+        TEMPLATE_RENDER.observe(seconds, template=name)
+
+# Sampling profiler for slow requests
+class StackSampler:
+    # Samples the event loop thread's stack every `interval` seconds into a
+    # short ring buffer. Slow requests dump the samples taken while they ran
+    # as folded stacks ("a;b;c count"), ready for flamegraph.pl / speedscope.
+    # Concurrent requests share the loop, so a dump can include their frames too.
+    def __init__(self, interval: float, output_dir: str, history_seconds: float = 30.0):
+        self.interval = interval
+        self.output_dir = output_dir
+        self._samples = deque(maxlen=int(history_seconds / interval))
+        self._thread_id = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        os.makedirs(self.output_dir, exist_ok=True)
+        threading.Thread(target=self._run, name="stack-sampler", daemon=True).start()
+
+    def _run(self):
+        while True:
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._samples.append((time.perf_counter(), ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def dump(self, start: float, end: float, label: str):
+        folded = Counter(stack for ts, stack in list(self._samples) if start <= ts <= end)
+        if not folded:
+            return
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = os.path.join(self.output_dir, f"{int(time.time() * 1000)}_{safe_label}.folded")
+        with open(path, "w") as f:
+            for stack, count in folded.items():
+                f.write(f"{stack} {count}\n")
+
+sampler: StackSampler | None = None
+
+# Startup timing (always on). Cold start = import + startup + first_request.
+logger = logging.getLogger("app.startup")
+startup_timings: dict[str, float] = {}
+
+def record_startup(phase: str, seconds: float):
+    startup_timings[phase] = seconds
+    logger.info("startup phase %s took %.3fs", phase, seconds)
+    if phase == "first_request":
+        cold_start = sum(startup_timings.get(p, 0.0) for p in ("import", "startup", "first_request"))
+        startup_timings["cold_start"] = cold_start
+        if settings.STARTUP_BUDGET_SECONDS > 0 and cold_start > settings.STARTUP_BUDGET_SECONDS:
+            logger.warning("cold start %.3fs is over the %.3fs budget: %s", cold_start, settings.STARTUP_BUDGET_SECONDS, startup_timings)
+
+def startup_report() -> dict:
+    budget = settings.STARTUP_BUDGET_SECONDS
+    cold_start = startup_timings.get("cold_start")
+    return {
+        "phases": startup_timings,
+        "budget_seconds": budget or None,
+        "within_budget": None if not budget or cold_start is None else cold_start <= budget,
+    }
+
+def _is_event_stream(message) -> bool:
+    # Server-sent event streams stay open for minutes; their duration isn't latency
+    headers = dict(message.get("headers", []))
+    return headers.get(b"content-type", b"").startswith(b"text/event-stream")
+
+class FirstRequestTimer:
+    # Times the worker's first HTTP request (cold caches, lazy imports, first
+    # checkout), then gets out of the way
+    def __init__(self, app):
+        self.app = app
+        self.pending = True
+
+    async def __call__(self, scope, receive, send):
+        if not self.pending or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.pending = False
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start" and _is_event_stream(message):
+                streaming = True
+                self.pending = True # time the next request instead
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not streaming:
+                record_startup("first_request", time.perf_counter() - start)
+
+# Middleware
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_holder = {"status": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                status_holder["streaming"] = _is_event_stream(message)
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            _request_stats.reset(token)
+            if not status_holder["streaming"]:
+                route = scope.get("route")
+                path = route.path if route is not None else "unmatched"
+                labels = {"method": scope["method"], "route": path}
+
+                REQUEST_LATENCY.observe(end - start, status=status_holder["status"], **labels)
+                REQUEST_DB_QUERIES.observe(stats.db_queries, **labels)
+                REQUEST_DB_TIME.observe(stats.db_seconds, **labels)
+                SERIALIZE_TIME.observe(stats.serialize_seconds, **labels)
+
+                if sampler is not None and (end - start) * 1000 >= settings.PROFILE_SLOW_REQUEST_MS:
+                    sampler.dump(start, end, f"{scope['method']}_{path}")
+
+def setup_metrics(app, engines):
+    global sampler
+    for engine in {id(e): e for e in engines}.values():
+        instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+    if settings.PROFILE_SLOW_REQUEST_MS > 0:
+        sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000, settings.PROFILE_OUTPUT_DIR)
+
+def start_sampler():
+    # Must run on the event loop thread (i.e. from the startup hook)
+    if sampler is not None:
+        sampler.start()
+
+def render_metrics(pool_stats: dict, cache_stats: dict) -> str:
+    lines = []
+    for histogram in (REQUEST_LATENCY, REQUEST_DB_QUERIES, REQUEST_DB_TIME, SERIALIZE_TIME, TEMPLATE_RENDER):
+        lines.extend(histogram.render())
+
+    gauges = defaultdict(list)
+    for pool, stats in pool_stats.items():
+        for key, value in stats.items():
+            gauges[f"db_pool_{key}"].append(f'db_pool_{key}{{pool="{pool}"}} {value}')
+    for name, samples in gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+
+    if startup_timings:
+        lines.append("# TYPE app_startup_seconds gauge")
+        for phase, seconds in startup_timings.items():
+            lines.append(f'app_startup_seconds{{phase="{phase}"}} {seconds}')
+
+    for key, value in cache_stats.items():
+        kind = "counter" if key in ("hits", "misses", "evictions") else "gauge"
+        lines.append(f"# TYPE report_cache_{key} {kind}")
+        lines.append(f"report_cache_{key} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,120 @@
+"""Apply database migrations once, before any web worker starts.
+
+    python -m app.migrate
+
+Workers never touch the schema; a deploy runs this step first (see render.yaml).
+Every shard (DATABASE_URL, then SHARD_DATABASE_URLS) gets the same schema.
+Databases created by the old create_all-at-startup have tables but no
+alembic_version: they are brought up to the baseline (missing tables and
+indexes only) and stamped, then upgraded like any other.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from .database import Base, SHARD_URLS, SHARD_ID_SPAN
+from . import models # noqa: F401 (registers the tables on Base.metadata)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_REVISION = "0001"
+
+logger = logging.getLogger("app.migrate")
+
+def alembic_config(url: str | None = None) -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    if url:
+        config.attributes["url"] = url
+    return config
+
+# Tables in the baseline revision; later migrations create their own
+BASELINE_TABLES = (
+    "users", "products", "sales", "payments", "payment_callbacks",
+    "daily_pnl", "product_daily_pnl", "data_versions",
+)
+
+async def _adopt_legacy_database(url: str) -> bool:
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+            if "alembic_version" in tables or "users" not in tables:
+                return False
+            # create_all only adds whole tables; indexes added to existing tables need their own
+            # pass (IF NOT EXISTS, since reflection can't see expression indexes to check first).
+            # Indexes on columns that later migrations add are left to those migrations.
+            baseline = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=baseline))
+            await _rename_duplicate_products(conn)
+            for table in baseline:
+                columns = await conn.run_sync(
+                    lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table.name)}
+                )
+                for index in table.indexes:
+                    if all(column.name in columns for column in index.columns):
+                        await conn.execute(CreateIndex(index, if_not_exists=True))
+            return True
+    finally:
+        await engine.dispose()
+
+async def _rename_duplicate_products(conn):
+    # Product names used to be free-form; the baseline makes (user_id, name)
+    # unique. Every duplicate but the oldest gets its id appended ("Tea #42"),
+    # so stock and sales stay with the row they were recorded on.
+    result = await conn.execute(text("""
+        UPDATE products SET name = name || ' #' || CAST(id AS VARCHAR)
+        WHERE EXISTS (
+            SELECT 1 FROM products AS older
+            WHERE older.user_id = products.user_id AND older.name = products.name AND older.id < products.id
+        )
+    """))
+    if result.rowcount:
+        logger.warning("Renamed %d products whose name repeated an older product's", result.rowcount)
+
+# Tables whose ids each shard hands out from its own range (see crud._assign_ids)
+SHARD_ID_TABLES = ("products", "sales")
+
+async def _start_id_ranges(url: str, shard: int):
+    # Postgres takes ids from sequences: start shard N's at N * SHARD_ID_SPAN.
+    # Never moves one back, so re-running is harmless.
+    if shard == 0 or not url.startswith("postgresql"):
+        return
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            for table in SHARD_ID_TABLES:
+                sequence = (await conn.execute(text(f"SELECT pg_get_serial_sequence('{table}', 'id')"))).scalar_one()
+                last = (await conn.execute(text(f"SELECT last_value FROM {sequence}"))).scalar_one()
+                if last < shard * SHARD_ID_SPAN:
+                    await conn.execute(text("SELECT setval(:sequence, :start)"), {"sequence": sequence, "start": shard * SHARD_ID_SPAN})
+    finally:
+        await engine.dispose()
+
+def upgrade(url: str | None = None):
+    if url is None:
+        for shard, shard_url in enumerate(SHARD_URLS):
+            _upgrade_one(shard_url)
+            asyncio.run(_start_id_ranges(shard_url, shard))
+        return
+    _upgrade_one(url)
+
+def _upgrade_one(url: str):
+    config = alembic_config(url)
+    if asyncio.run(_adopt_legacy_database(url)):
+        logger.info("Adopted unversioned database at revision %s", BASELINE_REVISION)
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s [%(name)s] %(message)s")
+    start = time.perf_counter()
+    upgrade()
+    logger.info("Migrations finished in %.2fs", time.perf_counter() - start)
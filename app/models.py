@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, DateTime, ForeignKey, Enum, Index, Text, func
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -33,10 +33,19 @@ class Product(Base):
     cost_price = Column(Float)
     selling_price = Column(Float)
     stock_quantity = Column(Integer, default=0)
+    # Tenant change version of the last write to this row (see crud.change_version)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     owner = relationship("User", back_populates="products")
     sales = relationship("Sale", back_populates="product")
 
+    # Natural key for bulk import upserts; lower(name) serves search prefix lookups
+    __table_args__ = (
+        Index("ix_products_user_name", "user_id", "name", unique=True),
+        Index("ix_products_user_lower_name", user_id, func.lower(name)),
+        Index("ix_products_user_version", "user_id", "version", "id"),
+    )
+
 class Sale(Base):
     __tablename__ = "sales"
 
@@ -46,11 +55,87 @@ class Sale(Base):
     quantity_sold = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     total_amount = Column(Float) # Snapshot
+    unit_cost = Column(Float) # Product cost_price at sale time; rollup rebuilds and exports use it
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set by offline POS clients; makes re-uploading a queued sale a no-op
+    client_id = Column(String, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="sales")
     product = relationship("Product", back_populates="sales")
 
+    # Listing and reports always filter by user and order/range by date
+    __table_args__ = (
+        Index("ix_sales_user_date", "user_id", "date"),
+        Index("ix_sales_user_version", "user_id", "version", "id"),
+        Index("ix_sales_user_client_id", "user_id", "client_id", unique=True),
+    )
+
+class DailyPnl(Base):
+    # Per-user, per-day rollup of sales, maintained by crud.create_sale.
+    # Cost is snapshotted at sale time, so later cost_price edits don't rewrite history.
+    __tablename__ = "daily_pnl"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    revenue = Column(Float, default=0.0)
+    cost = Column(Float, default=0.0)
+    units_sold = Column(Integer, default=0)
+    sales_count = Column(Integer, default=0)
+
+class ProductDailyPnl(Base):
+    # Per-user, per-product, per-local-day rollup (REPORT_TIMEZONE) behind /reports/analytics.
+    # week/month hold the bucket start dates so any granularity is a plain GROUP BY.
+    __tablename__ = "product_daily_pnl"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    week = Column(Date)
+    month = Column(Date)
+    revenue = Column(Float, default=0.0)
+    cost = Column(Float, default=0.0)
+    units_sold = Column(Integer, default=0)
+    sales_count = Column(Integer, default=0)
+
+class DataVersion(Base):
+    # Per-user counter bumped on every sale or product write. Cheap to read,
+    # it lets clients revalidate cached responses (ETag) without re-querying,
+    # and rows written in that transaction are stamped with it for /sync.
+    __tablename__ = "data_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, default=0)
+
+class ProductTombstone(Base):
+    # A deleted product, so /sync can tell offline clients to drop it
+    __tablename__ = "product_tombstones"
+
+    product_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_product_tombstones_user_version", "user_id", "version", "product_id"),
+    )
+
+class IdHighWater(Base):
+    # Per shard, SQLite only: the highest product/sale id handed out, so the id
+    # of a deleted or moved-away row is never given out again (crud._assign_ids)
+    __tablename__ = "id_high_water"
+
+    table_name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+
+class TenantShard(Base):
+    # Shard directory, on shard 0 only: which shard holds a tenant's products,
+    # sales and rollups. Tenants without a row are on shard 0.
+    __tablename__ = "tenant_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(Integer, nullable=False)
+    state = Column(String, nullable=False, default="active", server_default="active") # "moving" while app.tenant_move copies it
+
 class Payment(Base):
     __tablename__ = "payments"
 
@@ -63,3 +148,23 @@ class Payment(Base):
 
     # Relationships
     user = relationship("User", back_populates="payments")
+
+class PaymentCallback(Base):
+    # Gateway callbacks, one row per transaction: the unique transaction_id makes
+    # retries no-ops, and rows with processed_at NULL are the worker's queue.
+    __tablename__ = "payment_callbacks"
+
+    id = Column(Integer, primary_key=True)
+    transaction_id = Column(String, unique=True, nullable=False)
+    response_code = Column(String)
+    payload = Column(Text)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_payment_callbacks_pending", "id",
+            sqlite_where=processed_at.is_(None),
+            postgresql_where=processed_at.is_(None)
+        ),
+    )
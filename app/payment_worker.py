@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from . import crud
+from .config import settings
+from .database import SessionLocal
+from .auth.user_cache import invalidate_user
+
+# Drains the payment_callbacks queue in batches. The callback endpoint only
+# enqueues and calls notify(); the worker also polls, so callbacks queued by
+# another process (or before a restart) are picked up too.
+
+logger = logging.getLogger(__name__)
+
+class PaymentCallbackWorker:
+    def __init__(self, batch_size: int, poll_seconds: float):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run_once(self) -> int:
+        async with SessionLocal() as db:
+            processed, paid_emails = await crud.process_payment_callbacks(db, self.batch_size)
+        for email in paid_emails:
+            # Drop the cached snapshot so the new is_paid takes effect immediately
+            await invalidate_user(email)
+        return processed
+
+    async def drain(self) -> int:
+        total = 0
+        while processed := await self.run_once():
+            total += processed
+        return total
+
+    async def _run(self):
+        while True:
+            # Clear before draining so a notify() that lands mid-batch isn't lost
+            self._wake.clear()
+            try:
+                await self.drain()
+            except Exception:
+                logger.exception("Payment callback batch failed; retrying after poll interval")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        # The event belongs to the running loop, so it's created here rather than in __init__
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+worker = PaymentCallbackWorker(settings.PAYMENT_WORKER_BATCH_SIZE, settings.PAYMENT_WORKER_POLL_SECONDS)
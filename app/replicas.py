@@ -0,0 +1,57 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import database
+from .config import settings
+
+# Which reads may use a read replica (READ_DATABASE_URL and friends). A tenant
+# reads from the primary for READ_AFTER_WRITE_SECONDS after its own last write,
+# so a sale shows up on the next page load while the replica still lags; other
+# tenants' listings and reports keep going to the replica. The in-memory record
+# is per worker: with several workers, plug in a shared backend (Redis, with
+# the window as the key's TTL) so a write on one worker counts on all of them.
+
+class RecentWritesBackend(ABC):
+    @abstractmethod
+    async def record(self, user_id: int, at: float) -> None:
+        ...
+
+    @abstractmethod
+    async def last_write(self, user_id: int) -> float | None:
+        ...
+
+class MemoryRecentWrites(RecentWritesBackend):
+    # Oldest write first, so entries past the window are dropped from the front
+    def __init__(self):
+        self._writes: OrderedDict[int, float] = OrderedDict()
+
+    async def record(self, user_id: int, at: float) -> None:
+        self._writes.pop(user_id, None)
+        self._writes[user_id] = at
+        expired = at - settings.READ_AFTER_WRITE_SECONDS
+        while self._writes and next(iter(self._writes.values())) < expired:
+            self._writes.popitem(last=False)
+
+    async def last_write(self, user_id: int) -> float | None:
+        return self._writes.get(user_id)
+
+recent_writes: RecentWritesBackend = MemoryRecentWrites()
+
+def set_recent_writes_backend(backend: RecentWritesBackend):
+    global recent_writes
+    recent_writes = backend
+
+def _enabled():
+    return any(shard.replica_engine is not None for shard in database.shards)
+
+async def note_write(user_id: int):
+    # After each committed tenant write (crud.commit_tenant_write)
+    if _enabled():
+        await recent_writes.record(user_id, time.time())
+
+async def route_reads(user_id: int, read_db: AsyncSession):
+    if not _enabled():
+        return
+    last = await recent_writes.last_write(user_id)
+    database.use_replica(read_db, last is None or time.time() - last >= settings.READ_AFTER_WRITE_SECONDS)
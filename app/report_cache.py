@@ -0,0 +1,139 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from .config import settings
+
+# Per-tenant cache of report results. Keys carry the tenant's version, which
+# crud bumps after every committed sale/product write, so a write makes all of
+# that tenant's cached reports unreachable at once (LRU evicts the leftovers).
+# Versions are bounded like the entries: forgetting one moves every untracked
+# tenant to a fresh base version, so no forgotten key becomes reachable again.
+# With the in-memory backend each worker has its own versions; other workers
+# catch up after REPORT_CACHE_TTL_SECONDS. Plug in a shared backend to avoid that.
+
+class ReportCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: tuple):
+        ...
+
+    @abstractmethod
+    async def set(self, key: tuple, value, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    async def get_version(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    async def bump_version(self, user_id: int) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+class MemoryReportCache(ReportCacheBackend):
+    # LRU bounded by entry count and by (approximate) JSON size in bytes
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[float, int, object]] = OrderedDict()
+        # Tenant -> version, LRU; tenants not in it are at _base_version
+        self._versions: OrderedDict[int, int] = OrderedDict()
+        self._last_version = 0
+        self._base_version = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    async def set(self, key: tuple, value, ttl_seconds: float) -> None:
+        size = len(value) if isinstance(value, bytes) else len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl_seconds, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_version(self, user_id: int) -> int:
+        version = self._versions.get(user_id)
+        if version is None:
+            return self._base_version
+        self._versions.move_to_end(user_id)
+        return version
+
+    async def bump_version(self, user_id: int) -> None:
+        # One counter for all tenants, so a version is never handed out twice
+        self._last_version += 1
+        self._versions[user_id] = self._last_version
+        self._versions.move_to_end(user_id)
+        if len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+            self._base_version = self._last_version
+
+    def _remove(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+report_cache: ReportCacheBackend = MemoryReportCache(
+    max_entries=settings.REPORT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.REPORT_CACHE_MAX_BYTES
+)
+
+def set_report_cache_backend(backend: ReportCacheBackend):
+    global report_cache
+    report_cache = backend
+
+def _enabled():
+    return settings.REPORT_CACHE_TTL_SECONDS > 0
+
+async def report_key(user_id: int, report: str, params: dict | None = None):
+    # Take the key *before* querying: if a write lands mid-query, the result is
+    # stored under the old version and never served.
+    version = await report_cache.get_version(user_id)
+    return (user_id, version, report, tuple(sorted((params or {}).items())))
+
+async def get_report(key: tuple):
+    if not _enabled():
+        return None
+    return await report_cache.get(key)
+
+async def store_report(key: tuple, value):
+    if _enabled():
+        await report_cache.set(key, value, settings.REPORT_CACHE_TTL_SECONDS)
+    return value
+
+async def invalidate_reports(user_id: int):
+    await report_cache.bump_version(user_id)
+
+def cache_stats() -> dict:
+    return report_cache.stats()
@@ -0,0 +1,33 @@
+import json
+import time
+from fastapi import Response
+from pydantic import TypeAdapter
+from . import metrics
+
+# Fast path for list endpoints: DB rows (tuples, not ORM objects) go straight
+# to JSON bytes. orjson is used when installed, otherwise the schema's
+# TypeAdapter serializes the plain dicts in pydantic-core; both produce the
+# same JSON as the response_model would, without validating the rows again.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    # What the stdlib encoder can't do on its own: datetimes and NumPy values
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value.isoformat()
+
+def dumps(value) -> bytes:
+    # Compact JSON bytes for hand-built bodies (sync deltas, SSE frames, columnar reports)
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":"), default=_default).encode()
+
+def rows_response(rows, adapter: TypeAdapter, headers: dict | None = None) -> Response:
+    start = time.perf_counter()
+    items = [row._asdict() for row in rows]
+    body = orjson.dumps(items) if orjson is not None else adapter.dump_json(items)
+    metrics.observe_serialize(time.perf_counter() - start)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,15 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from jose import JWTError, jwt
-from .. import schemas, database, models, crud
+from .. import schemas, database, models, crud, shards, replicas
 from ..auth import utils
+from ..auth.user_cache import CachedUser, get_cached_user, cache_user
 
 router = APIRouter(tags=["Authentication"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+def hasher_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(database.get_db),
+    read_db: AsyncSession = Depends(database.get_read_db),
+):
+    user = await authenticate_token(token, read_db)
+    # FastAPI hands the route these same per-request sessions: point them at the user's shard
+    await shards.bind(user.id, db, read_db)
+    await replicas.route_reads(user.id, read_db)
+    return user
+
+async def authenticate_token(token: str, db: AsyncSession, scope: str | None = None) -> CachedUser:
+    # `scope` is None for API tokens; narrow tokens (the /events one) carry a
+    # scope claim and are only accepted where that scope is asked for
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -18,50 +40,90 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     try:
         payload = jwt.decode(token, utils.SECRET_KEY, algorithms=[utils.ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    
+
+    # Cache hit skips the user SELECT (the session never even opens a connection)
+    cached = await get_cached_user(token_data.email)
+    if cached is not None:
+        return cached
+
     user = await crud.get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
+    return await cache_user(user)
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: CachedUser = Depends(get_current_user)):
     return current_user
 
 from ..config import settings
 
-async def get_current_active_paid_user(current_user: models.User = Depends(get_current_active_user)):
+async def get_current_active_paid_user(current_user: CachedUser = Depends(get_current_active_user)):
     if settings.PAYMENT_REQUIRED and not current_user.is_paid:
         raise HTTPException(status_code=403, detail="Payment required to access this feature.")
     return current_user
 
+# Login and register look users up on the read pool and hash with no write
+# connection held: SQLite has a single one, and every sale waits for it.
+
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_db)):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(database.get_db),
+    read_db: AsyncSession = Depends(database.get_read_db),
+):
     # OAuth2 specifies 'username' field, can contain email
-    user = await crud.get_user_by_email(db, form_data.username) 
-    if not user or not utils.verify_password(form_data.password, user.password_hash):
+    user = await crud.get_user_by_email(read_db, form_data.username)
+    await read_db.close()
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await utils.verify_and_update_password(form_data.password, user.password_hash)
+        except utils.PasswordHasherBusy:
+            raise hasher_busy_exception()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    email = user.email
+    if new_hash:
+        # Transparent rehash when the Argon2 parameters have been raised
+        await crud.update_password_hash(db, user.id, new_hash)
+
     access_token_expires = utils.timedelta(minutes=utils.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = utils.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=schemas.UserResponse)
-async def register(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
-    db_user = await crud.get_user_by_email(db, email=user.email)
+async def register(
+    user: schemas.UserCreate,
+    db: AsyncSession = Depends(database.get_db),
+    read_db: AsyncSession = Depends(database.get_read_db),
+):
+    db_user = await crud.get_user_by_email(read_db, email=user.email)
+    await read_db.close()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return await crud.create_user(db=db, user=user)
+    try:
+        # Hashes before its first statement, so the writer is only taken for the insert
+        return await crud.create_user(db=db, user=user)
+    except utils.PasswordHasherBusy:
+        raise hasher_busy_exception()
+    except IntegrityError:
+        # A concurrent registration took the email between the check and the insert
+        raise HTTPException(status_code=400, detail="Email already registered")
 
 @router.get("/users/me", response_model=schemas.UserResponse)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
+async def read_users_me(current_user: CachedUser = Depends(get_current_user), db: AsyncSession = Depends(database.get_read_db)):
+    # The cached snapshot is slim; profile fields come from the DB
+    user = await crud.get_user_by_email(db, email=current_user.email)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
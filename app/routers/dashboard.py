@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func
+from datetime import datetime, timedelta
+from .. import database, models, crud, schemas
+from ..routers.auth import get_current_active_paid_user
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"],
+    dependencies=[Depends(get_current_active_paid_user)]
+)
+
+@router.get("/summary")
+async def get_dashboard_summary(
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=366),
+    sales: int = Query(10, ge=1, le=100),
+    top: int = Query(5, ge=1, le=50),
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Everything the dashboard shows, in one request. The ETag is the user's data
+    # version and the window's first day, so an unchanged dashboard costs one
+    # primary-key lookup and a 304, and a new day still moves the window.
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    version = await crud.get_data_version(db, current_user.id)
+    etag = f'W/"{current_user.id}-{version}-{since.isoformat()}-{days}-{sales}-{top}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    # Totals and the daily series share one query: the rollup has a row per day, not per sale
+    result = await db.execute(
+        select(models.DailyPnl.day, models.DailyPnl.revenue, models.DailyPnl.cost)
+        .where(models.DailyPnl.user_id == current_user.id)
+        .order_by(models.DailyPnl.day)
+    )
+    rollup = result.all()
+
+    revenue = sum(row.revenue or 0.0 for row in rollup)
+    cost = sum(row.cost or 0.0 for row in rollup)
+    daily = [
+        {
+            "date": row.day.isoformat(),
+            "revenue": row.revenue or 0.0,
+            "cost": row.cost or 0.0,
+            "profit": (row.revenue or 0.0) - (row.cost or 0.0)
+        }
+        for row in rollup if row.day >= since
+    ]
+
+    # Top sellers over the same window, range-scanned through (user_id, date)
+    result = await db.execute(
+        select(
+            models.Sale.product_id,
+            func.coalesce(models.Product.name, "Unknown").label("name"),
+            func.sum(models.Sale.quantity_sold).label("units_sold"),
+            func.sum(models.Sale.total_amount).label("revenue")
+        ).outerjoin(models.Product, models.Product.id == models.Sale.product_id)
+        .where(
+            models.Sale.user_id == current_user.id,
+            models.Sale.date >= datetime.combine(since, datetime.min.time())
+        )
+        .group_by(models.Sale.product_id, models.Product.name)
+        .order_by(func.sum(models.Sale.quantity_sold).desc())
+        .limit(top)
+    )
+    top_products = [dict(row._mapping) for row in result.all()]
+
+    recent = await crud.get_sales(db=db, user_id=current_user.id, limit=sales)
+
+    return {
+        "totals": {
+            "revenue": revenue,
+            "cost": cost,
+            "profit": revenue - cost,
+            "currency": "PKR"
+        },
+        "daily": daily,
+        "top_products": top_products,
+        "recent_sales": [schemas.SaleResponse.model_validate(row) for row in recent]
+    }
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import timedelta
+from fastapi import APIRouter, Depends, Query, Response
+from .. import database, change_feed
+from ..auth import utils
+from ..config import settings
+from ..auth.user_cache import CachedUser
+from ..routers.auth import authenticate_token, get_current_active_paid_user
+
+router = APIRouter(tags=["Events"])
+
+class EventStreamResponse(Response):
+    # Server-sent events from the tenant's subscription. Hand-rolled rather than
+    # a StreamingResponse (a task group and two tasks per connection): an idle
+    # subscriber costs this coroutine plus one task waiting for the disconnect.
+    media_type = "text/event-stream"
+
+    def __init__(self, user_id: int):
+        super().__init__(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        del self.headers["content-length"] # open-ended body
+        self.user_id = user_id
+
+    async def __call__(self, scope, receive, send):
+        subscription = await change_feed.subscribe(self.user_id)
+        disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive, subscription))
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            # Sets the browser's reconnect delay
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+            while True:
+                frames = await subscription.next_frames(settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+                if subscription.closed:
+                    break
+                body = b"".join(frames) if frames else change_feed.HEARTBEAT
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            disconnect.cancel()
+            await change_feed.unsubscribe(subscription)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive, subscription):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        subscription.close()
+
+EVENTS_SCOPE = "events"
+
+@router.post("/events/token")
+async def create_events_token(current_user: CachedUser = Depends(get_current_active_paid_user)):
+    # EventSource can't set an Authorization header, so the stream is opened
+    # with this token in the query string instead of the API token: it ends up
+    # in access logs, so it is good for nothing else and expires within a minute.
+    expires_in = settings.EVENTS_TOKEN_EXPIRE_SECONDS
+    token = utils.create_access_token(
+        data={"sub": current_user.email, "scope": EVENTS_SCOPE}, expires_delta=timedelta(seconds=expires_in)
+    )
+    return {"token": token, "expires_in": expires_in}
+
+@router.get("/events")
+async def stream_events(token: str = Query(...)):
+    # The tenant's sales and product changes as they are committed. The token
+    # is only checked here, so an open stream outlives it; reconnecting takes
+    # a new one from POST /events/token.
+    # No session is held for the life of the stream: auth uses its own.
+    async with database.ReadSessionLocal() as db:
+        user = await authenticate_token(token, db, scope=EVENTS_SCOPE)
+    await get_current_active_paid_user(user)
+    return EventStreamResponse(user.id)
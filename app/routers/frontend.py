@@ -1,29 +1,105 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
+from dataclasses import dataclass
+import gzip
+import hashlib
+import time
+from ..metrics import observe_template
+from ..static_files import static_files
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 router = APIRouter(tags=["Frontend"])
 
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_files.url
+
+# The pages carry no per-user data (it's fetched by the page's JS), so each is
+# rendered once and kept as identity/gzip/brotli bytes with a strong ETag per
+# encoding. HTML is "no-cache": browsers revalidate and get a 304, and a deploy
+# with new asset hashes is picked up on the next load.
+PAGES = {
+    "/login": ("login.html", {}),
+    "/signup": ("login.html", {"mode": "signup"}),
+    "/dashboard": ("dashboard.html", {}),
+    "/products_page": ("products.html", {}),
+    "/sales_page": ("sales.html", {}),
+}
+
+@dataclass(frozen=True)
+class CompiledPage:
+    bodies: dict # content-encoding ("identity", "gzip", "br") -> bytes
+    etags: dict # content-encoding -> strong ETag
+
+_compiled: dict[str, CompiledPage] = {}
+
+def compile_page(name: str, context: dict) -> CompiledPage:
+    start = time.perf_counter()
+    html = templates.get_template(name).render(context).encode()
+    observe_template(name, time.perf_counter() - start)
+
+    bodies = {"identity": html, "gzip": gzip.compress(html, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(html, quality=11)
+    digest = hashlib.sha256(html).hexdigest()[:16]
+    etags = {
+        encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+        for encoding in bodies
+    }
+    return CompiledPage(bodies=bodies, etags=etags)
+
+def compile_pages():
+    # Called once from startup; pages are also compiled on first use
+    for path, (name, context) in PAGES.items():
+        _compiled[path] = compile_page(name, context)
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.partition(";")
+        if token.strip() == encoding:
+            params = params.strip()
+            try:
+                return not params.startswith("q=") or float(params[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+def serve_page(request: Request, path: str) -> Response:
+    page = _compiled.get(path)
+    if page is None:
+        page = _compiled[path] = compile_page(*PAGES[path])
+
+    accept_encoding = request.headers.get("accept-encoding", "")
+    encoding = next((e for e in ("br", "gzip") if e in page.bodies and _accepts(accept_encoding, e)), "identity")
+    headers = {"ETag": page.etags[encoding], "Cache-Control": "public, no-cache", "Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and page.etags[encoding] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.bodies[encoding], media_type="text/html", headers=headers)
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return serve_page(request, "/login")
 
 @router.get("/signup", response_class=HTMLResponse)
 async def signup_page(request: Request):
-    # Reusing login template usually, or a separate one. Let's assume separate for clarity or toggle in one.
-    # For now, separate endpoint, maybe same template with a mode flag?
-    return templates.TemplateResponse("login.html", {"request": request, "mode": "signup"})
+    return serve_page(request, "/signup")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_page(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return serve_page(request, "/dashboard")
 
 @router.get("/products_page", response_class=HTMLResponse)
 async def products_page(request: Request):
-    return templates.TemplateResponse("products.html", {"request": request})
+    return serve_page(request, "/products_page")
 
 @router.get("/sales_page", response_class=HTMLResponse)
 async def sales_page(request: Request):
-    return templates.TemplateResponse("sales.html", {"request": request})
+    return serve_page(request, "/sales_page")
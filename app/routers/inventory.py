@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from .. import schemas, database, models, crud
+from typing import List, Optional
+import csv
+import io
+import json
+from .. import schemas, database, models, crud, responses, shards
 from ..routers.auth import get_current_active_paid_user
 
 router = APIRouter(
@@ -10,17 +16,38 @@ router = APIRouter(
     dependencies=[Depends(get_current_active_paid_user)]
 )
 
+IMPORT_CHUNK_SIZE = 500
+EXPORT_FIELDS = ["id", "name", "cost_price", "selling_price", "stock_quantity"]
+
 @router.post("/", response_model=schemas.ProductResponse)
 async def create_product(product: schemas.ProductCreate, current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
-    return await crud.create_product(db=db, product=product, user_id=current_user.id)
+    try:
+        return await crud.create_product(db=db, product=product, user_id=current_user.id)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="A product with this name already exists")
 
 @router.get("/", response_model=List[schemas.ProductResponse])
-async def read_products(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
-    return await crud.get_products(db=db, user_id=current_user.id)
+async def read_products(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_read_db)):
+    rows = await crud.get_products(db=db, user_id=current_user.id)
+    return responses.rows_response(rows, schemas.ProductRows)
+
+@router.get("/search", response_model=List[schemas.ProductResponse])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Autocomplete: prefix matches first, then substring, then fuzzy (typos)
+    rows = await crud.search_products(db=db, user_id=current_user.id, q=q, limit=limit)
+    return responses.rows_response(rows, schemas.ProductRows)
 
 @router.put("/{product_id}", response_model=schemas.ProductResponse)
 async def update_product(product_id: int, product: schemas.ProductCreate, current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
-    db_product = await crud.update_product(db=db, product_id=product_id, product_update=product, user_id=current_user.id)
+    try:
+        db_product = await crud.update_product(db=db, product_id=product_id, product_update=product, user_id=current_user.id)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="A product with this name already exists")
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found or not owned by user")
     return db_product
@@ -31,3 +58,104 @@ async def delete_product(product_id: int, current_user: models.User = Depends(ge
     if not success:
         raise HTTPException(status_code=404, detail="Product not found or not owned by user")
     return {"message": "Product deleted successfully"}
+
+class UnreadableImport(Exception):
+    # The file can't be read past `line`: not UTF-8, or broken CSV quoting
+    def __init__(self, line: int, message: str):
+        super().__init__(message)
+        self.line = line
+
+def _decoded_lines(upload: UploadFile):
+    # Line by line rather than a TextIOWrapper, so a bad byte is reported on its own line
+    for line_num, line in enumerate(upload.file, start=1):
+        try:
+            yield line.decode("utf-8-sig" if line_num == 1 else "utf-8")
+        except UnicodeDecodeError:
+            raise UnreadableImport(line_num, "File must be UTF-8 CSV or NDJSON")
+
+def _read_import_rows(upload: UploadFile, fmt: str):
+    # Yields (line number, parsed product or ValidationError) one row at a time,
+    # and finally an UnreadableImport if the rest of the file can't be read
+    lines = _decoded_lines(upload)
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(lines)
+            try:
+                for row in reader:
+                    try:
+                        yield reader.line_num, schemas.ProductCreate.model_validate(row)
+                    except ValidationError as e:
+                        yield reader.line_num, e
+            except csv.Error as e:
+                raise UnreadableImport(reader.line_num, f"Malformed CSV: {e}")
+        else:
+            for line_num, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_num, schemas.ProductCreate.model_validate_json(line)
+                except ValidationError as e:
+                    yield line_num, e
+    except UnreadableImport as e:
+        yield e.line, e
+
+@router.post("/import")
+async def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_db),
+):
+    # Upsert on (user_id, name) in bulk chunks; bad rows are reported, not fatal.
+    # A file that can't be read on (wrong encoding, broken quoting) is imported
+    # up to that line, and the line is reported.
+    fmt = format or ("ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv")
+    user_id = current_user.id # current_user is expired by the per-chunk commits
+    imported = 0
+    errors = []
+    chunk = []
+
+    for line_num, product in _read_import_rows(file, fmt):
+        if isinstance(product, ValidationError):
+            errors.append({"line": line_num, "errors": product.errors(include_url=False, include_context=False)})
+            continue
+        if isinstance(product, UnreadableImport):
+            errors.append({"line": line_num, "errors": [{"type": "unreadable", "loc": [], "msg": str(product)}]})
+            break
+        chunk.append(product)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            imported += await crud.upsert_products(db=db, products=chunk, user_id=user_id)
+            chunk = []
+
+    if chunk:
+        imported += await crud.upsert_products(db=db, products=chunk, user_id=user_id)
+
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+@router.get("/export")
+async def export_products(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_user: models.User = Depends(get_current_active_paid_user),
+):
+    user_id = current_user.id
+
+    async def generate():
+        # Own session: the request-scoped one may be closed while we are still streaming
+        async with shards.tenant_session(user_id, read=True) as db:
+            if format == "csv":
+                yield ",".join(EXPORT_FIELDS) + "\n"
+            async for rows in crud.stream_products(db, user_id):
+                buffer = io.StringIO()
+                if format == "csv":
+                    csv.writer(buffer).writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(row._mapping)) + "\n")
+                yield buffer.getvalue()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
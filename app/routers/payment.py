@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from datetime import datetime
+from datetime import datetime, timedelta
 import hmac
 import hashlib
-from .. import schemas, database, models, crud
-from ..auth import utils
+import json
+from .. import schemas, database, models, crud, payment_worker
 from ..routers.auth import get_current_user
+from ..txn_ref import new_txn_ref
 
 router = APIRouter(
     prefix="/payment",
@@ -26,9 +26,61 @@ def generate_secure_hash(params: dict, salt: str):
             raw_string += f"&{value}"     
     return hmac.new(salt.encode(), raw_string.encode(), hashlib.sha256).hexdigest().upper()
 
+# Fields that are the same for every initiation; the rest are filled in per call
+STATIC_PARAMS = {
+    "pp_Version": "2.0",
+    "pp_TxnType": "MWALLET",
+    "pp_Language": "EN",
+    "pp_MerchantID": JC_MERCHANT_ID,
+    "pp_SubMerchantID": "",
+    "pp_Password": JC_PASSWORD,
+    "pp_BankID": "TBANK",
+    "pp_ProductID": "RETAIL",
+    "pp_TxnCurrency": "PKR",
+    "pp_BillReference": "billRef",
+    "pp_Description": "Shop Fees",
+    "pp_ReturnURL": JC_RETURN_URL,
+    "pp_mpf_1": "1",
+    "pp_mpf_2": "2",
+    "pp_mpf_3": "3",
+    "pp_mpf_4": "4",
+    "pp_mpf_5": "5",
+}
+VARIABLE_PARAMS = ("pp_TxnRefNo", "pp_Amount", "pp_TxnDateTime", "pp_TxnExpiryDateTime")
+
+class SecureHashTemplate:
+    # generate_secure_hash with the static fields pre-joined and the HMAC already
+    # keyed and fed the salt prefix: signing only appends the variable values.
+    def __init__(self, static_params: dict, variable_keys, salt: str):
+        self._segments = [] # (static text before the field, variable field)
+        literal = ""
+        for key in sorted(set(static_params) | set(variable_keys)):
+            if key == "pp_SecureHash":
+                continue
+            if key in variable_keys:
+                self._segments.append((literal, key))
+                literal = ""
+            elif static_params[key]:
+                literal += f"&{static_params[key]}"
+        self._tail = literal
+        self._hmac = hmac.new(salt.encode(), salt.encode(), hashlib.sha256)
+
+    def sign(self, values: dict) -> str:
+        parts = []
+        for literal, key in self._segments:
+            parts.append(literal)
+            if values.get(key):
+                parts.append(f"&{values[key]}")
+        parts.append(self._tail)
+        digest = self._hmac.copy()
+        digest.update("".join(parts).encode())
+        return digest.hexdigest().upper()
+
+INITIATE_HASH = SecureHashTemplate(STATIC_PARAMS, VARIABLE_PARAMS, JC_INTEGRITY_SALT)
+
 @router.post("/initiate")
 async def initiate_payment(payment_request: schemas.PaymentInitiate, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
-    txn_ref = f"T{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{current_user.id}"
+    txn_ref = new_txn_ref()
     
     # Create Payment Record (renamed from Transaction)
     payment = models.Payment(
@@ -40,34 +92,14 @@ async def initiate_payment(payment_request: schemas.PaymentInitiate, current_use
     db.add(payment)
     await db.commit()
     
-    amount_str = f"{payment_request.amount:.2f}"
-    params = {
-        "pp_Version": "2.0",
-        "pp_TxnType": "MWALLET",
-        "pp_Language": "EN",
-        "pp_MerchantID": JC_MERCHANT_ID,
-        "pp_SubMerchantID": "",
-        "pp_Password": JC_PASSWORD,
-        "pp_BankID": "TBANK",
-        "pp_ProductID": "RETAIL",
+    now = datetime.utcnow()
+    variable = {
         "pp_TxnRefNo": txn_ref,
-        "pp_Amount": amount_str,
-        "pp_TxnCurrency": "PKR",
-        "pp_TxnDateTime": datetime.utcnow().strftime("%Y%m%d%H%M%S"),
-        "pp_BillReference": "billRef",
-        "pp_Description": "Shop Fees",
-        "pp_TxnExpiryDateTime": (datetime.utcnow() + utils.timedelta(hours=1)).strftime("%Y%m%d%H%M%S"),
-        "pp_ReturnURL": JC_RETURN_URL,
-        "pp_SecureHash": "",
-        "pp_mpf_1": "1",
-        "pp_mpf_2": "2",
-        "pp_mpf_3": "3",
-        "pp_mpf_4": "4",
-        "pp_mpf_5": "5",
+        "pp_Amount": f"{payment_request.amount:.2f}",
+        "pp_TxnDateTime": now.strftime("%Y%m%d%H%M%S"),
+        "pp_TxnExpiryDateTime": (now + timedelta(hours=1)).strftime("%Y%m%d%H%M%S"),
     }
-    
-    secure_hash = generate_secure_hash(params, JC_INTEGRITY_SALT)
-    params["pp_SecureHash"] = secure_hash
+    params = {**STATIC_PARAMS, **variable, "pp_SecureHash": INITIATE_HASH.sign(variable)}
     
     return {
         "action_url": "https://sandbox.jazzcash.com.pk/CustomerPortal/transactionmanagement/merchantform/",
@@ -76,27 +108,20 @@ async def initiate_payment(payment_request: schemas.PaymentInitiate, current_use
 
 @router.post("/callback")
 async def payment_callback(request: Request, db: AsyncSession = Depends(database.get_db)):
+    # Verify, enqueue and acknowledge; payment_worker applies the result. Retries
+    # of an already-received transaction are acknowledged without doing anything.
     form_data = await request.form()
     data = dict(form_data)
-    
-    response_code = data.get("pp_ResponseCode")
+
+    expected_hash = generate_secure_hash(data, JC_INTEGRITY_SALT)
+    if not hmac.compare_digest(expected_hash, str(data.get("pp_SecureHash", "")).upper()):
+        raise HTTPException(status_code=400, detail="Invalid secure hash")
+
     txn_ref = data.get("pp_TxnRefNo")
-    
-    result = await db.execute(select(models.Payment).where(models.Payment.transaction_id == txn_ref))
-    payment = result.scalars().first()
-    
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-        
-    if response_code == "000":
-        payment.status = "success"
-        result_user = await db.execute(select(models.User).where(models.User.id == payment.user_id))
-        user = result_user.scalars().first()
-        if user:
-            user.is_paid = True
-            db.add(user)
-    else:
-        payment.status = "failed"
-        
-    await db.commit()
+    if not txn_ref:
+        raise HTTPException(status_code=400, detail="Missing transaction reference")
+
+    queued = await crud.enqueue_payment_callback(db, txn_ref, data.get("pp_ResponseCode"), json.dumps(data))
+    if queued:
+        payment_worker.worker.notify()
     return {"status": "received"}
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from .. import database, models
+from datetime import date
+from typing import Literal, Optional
+from .. import database, models, report_cache, columnar
+from ..config import settings
 from ..routers.auth import get_current_active_paid_user
 
 router = APIRouter(
@@ -12,39 +15,43 @@ router = APIRouter(
 )
 
 @router.get("/pnl")
-async def get_profit_and_loss(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
-    # Calculate Revenue
-    stmt = select(func.sum(models.Sale.total_amount)).where(models.Sale.user_id == current_user.id)
+async def get_profit_and_loss(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_read_db)):
+    key = await report_cache.report_key(current_user.id, "pnl")
+    cached = await report_cache.get_report(key)
+    if cached is not None:
+        return cached
+
+    # Totals come from the daily rollup (one row per day) instead of scanning sales
+    stmt = select(
+        func.sum(models.DailyPnl.revenue).label("revenue"),
+        func.sum(models.DailyPnl.cost).label("cost")
+    ).where(models.DailyPnl.user_id == current_user.id)
     result = await db.execute(stmt)
-    revenue = result.scalar() or 0.0
-    
-    # Calculate Cost (Requires Join since we didn't snapshot total_cost in new schema)
-    # SUM(sale.quantity_sold * product.cost_price)
-    stmt_cost = select(func.sum(models.Sale.quantity_sold * models.Product.cost_price))\
-        .join(models.Product)\
-        .where(models.Sale.user_id == current_user.id)
-        
-    result_cost = await db.execute(stmt_cost)
-    cost = result_cost.scalar() or 0.0
-    
+    row = result.one()
+
+    revenue = row.revenue or 0.0
+    cost = row.cost or 0.0
     profit = revenue - cost
     
-    return {
+    return await report_cache.store_report(key, {
         "revenue": revenue,
         "cost": cost,
         "profit": profit,
         "currency": "PKR"
-    }
+    })
 
 @router.get("/daily")
-async def get_daily_pnl(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
-    # Group by Date
-    # SQLite has func.date()
+async def get_daily_pnl(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_read_db)):
+    key = await report_cache.report_key(current_user.id, "daily")
+    cached = await report_cache.get_report(key)
+    if cached is not None:
+        return cached
+
     stmt = select(
-        func.date(models.Sale.date).label("day"),
-        func.sum(models.Sale.total_amount).label("revenue"),
-        func.sum(models.Sale.quantity_sold * models.Product.cost_price).label("cost")
-    ).join(models.Product).where(models.Sale.user_id == current_user.id).group_by(func.date(models.Sale.date))
+        models.DailyPnl.day,
+        models.DailyPnl.revenue,
+        models.DailyPnl.cost
+    ).where(models.DailyPnl.user_id == current_user.id).order_by(models.DailyPnl.day)
     
     result = await db.execute(stmt)
     rows = result.all()
@@ -55,10 +62,96 @@ async def get_daily_pnl(current_user: models.User = Depends(get_current_active_p
         cost = row.cost or 0.0
         profit = revenue - cost
         report.append({
-            "date": row.day,
+            "date": row.day.isoformat(),
             "revenue": revenue,
             "cost": cost,
             "profit": profit
         })
         
-    return report
+    return await report_cache.store_report(key, report)
+
+@router.get("/analytics")
+async def get_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: Literal["day", "week", "month"] = "day",
+    tz: str = settings.REPORT_TIMEZONE,
+    group_by: Optional[Literal["product"]] = None,
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Served from product_daily_pnl, whose days are already local to REPORT_TIMEZONE.
+    # Weeks start on Monday; start/end are inclusive local dates.
+    if tz != settings.REPORT_TIMEZONE:
+        raise HTTPException(status_code=400, detail=f"Analytics are bucketed in {settings.REPORT_TIMEZONE}")
+
+    params = {"start": start, "end": end, "granularity": granularity, "group_by": group_by}
+    key = await report_cache.report_key(current_user.id, "analytics", params)
+    cached = await report_cache.get_report(key)
+    if cached is not None:
+        return cached
+
+    rollup = models.ProductDailyPnl
+    bucket = getattr(rollup, granularity).label("period")
+    columns = [
+        bucket,
+        func.sum(rollup.revenue).label("revenue"),
+        func.sum(rollup.cost).label("cost"),
+        func.sum(rollup.units_sold).label("units_sold"),
+        func.sum(rollup.sales_count).label("sales_count")
+    ]
+    group = [bucket]
+    if group_by == "product":
+        columns[1:1] = [rollup.product_id, func.coalesce(models.Product.name, "Unknown").label("product_name")]
+        group += [rollup.product_id, models.Product.name]
+
+    stmt = select(*columns).where(rollup.user_id == current_user.id)
+    if group_by == "product":
+        stmt = stmt.outerjoin(models.Product, models.Product.id == rollup.product_id)
+    if start is not None:
+        stmt = stmt.where(rollup.day >= start)
+    if end is not None:
+        stmt = stmt.where(rollup.day <= end)
+    stmt = stmt.group_by(*group).order_by(bucket)
+
+    result = await db.execute(stmt)
+    report = []
+    for row in result.all():
+        revenue = row.revenue or 0.0
+        cost = row.cost or 0.0
+        profit = revenue - cost
+        entry = {
+            "period": row.period.isoformat(),
+            "revenue": revenue,
+            "cost": cost,
+            "profit": profit,
+            "margin": profit / revenue if revenue else 0.0,
+            "units_sold": row.units_sold or 0,
+            "sales_count": row.sales_count or 0
+        }
+        if group_by == "product":
+            entry = {"product_id": row.product_id, "product_name": row.product_name, **entry}
+        report.append(entry)
+
+    return await report_cache.store_report(key, report)
+
+@router.get("/columnar")
+async def get_columnar_report(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    window: int = Query(7, ge=1, le=365),
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Vectorized daily report for large tenants: UTC days, moving average of revenue
+    # over the last `window` days with sales, cumulative profit and basket size percentiles.
+    # Column-oriented response: {"date": [...], "revenue": [...], ...}
+    if not columnar.available():
+        raise HTTPException(status_code=501, detail="Columnar reports require numpy")
+
+    key = await report_cache.report_key(current_user.id, "columnar", {"start": start, "end": end, "window": window})
+    body = await report_cache.get_report(key)
+    if body is None:
+        arrays = await columnar.load_sales_arrays(db, current_user.id, start, end)
+        body = await report_cache.store_report(key, columnar.encode(columnar.daily_report(arrays, window=window)))
+    return Response(content=body, media_type="application/json")
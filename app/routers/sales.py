@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
-from .. import schemas, database, models, crud
+from typing import List, Optional
+from datetime import datetime
+from .. import schemas, database, models, crud, export, responses, shards
 from ..routers.auth import get_current_active_paid_user
 
 router = APIRouter(
@@ -11,6 +12,10 @@ router = APIRouter(
     dependencies=[Depends(get_current_active_paid_user)]
 )
 
+# Same cap as an offline upload (/sync/sales): one basket is one CASE UPDATE
+# and one INSERT, holding the writer for all of its lines
+MAX_BASKET_LINES = 500
+
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
@@ -22,47 +27,95 @@ async def create_sale(sale: schemas.SaleCreate, current_user: models.User = Depe
         if db_sale is None:
              raise HTTPException(status_code=404, detail="Product not found or not owned by user")
         
-        # Explicit fetch for response
-        product_stmt = await db.execute(select(models.Product).where(models.Product.id == sale.product_id))
-        product = product_stmt.scalars().first()
-        
-        return schemas.SaleResponse(
-            id=db_sale.id,
-            product_name=product.name if product else "Unknown",
-            quantity_sold=db_sale.quantity_sold,
-            total_amount=db_sale.total_amount,
-            date=db_sale.date
-        )
+        return schemas.SaleResponse.model_validate(db_sale)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/", response_model=List[schemas.SaleResponse])
-async def read_sales(current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
+@router.post("/batch", response_model=List[schemas.SaleResponse])
+async def create_sales_batch(items: List[schemas.SaleCreate] = Body(..., max_length=MAX_BASKET_LINES), current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
+    # Basket checkout: all lines are sold together or none are
+    if not items:
+        raise HTTPException(status_code=400, detail="Basket is empty")
     try:
-        sales = await crud.get_sales(db=db, user_id=current_user.id)
-        
-        # Explicitly fetch products via a second query to avoid async relationship loading issues
-        product_ids = [s.product_id for s in sales]
-        start_products = {}
-        if product_ids:
-            stmt = select(models.Product).where(models.Product.id.in_(product_ids))
-            result = await db.execute(stmt)
-            products = result.scalars().all()
-            start_products = {p.id: p for p in products}
+        sales = await crud.create_sales_batch(db=db, items=items, user_id=current_user.id)
+    except crud.SaleLineError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"line": e.line, "product_id": e.product_id, "error": str(e)}
+        )
+    return [schemas.SaleResponse.model_validate(sale) for sale in sales]
+
+def _encode_cursor(date: datetime, sale_id: int) -> str:
+    return f"{date.isoformat()}_{sale_id}"
+
+def _decode_cursor(cursor: str):
+    try:
+        date_str, sale_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(date_str), int(sale_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/", response_model=List[schemas.SaleResponse])
+async def read_sales(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Newest first. Pass the X-Next-Cursor header back as `cursor` for the next page.
+    rows = await crud.get_sales(
+        db=db,
+        user_id=current_user.id,
+        limit=limit,
+        cursor=_decode_cursor(cursor) if cursor else None,
+        start_date=start_date,
+        end_date=end_date,
+        product_id=product_id,
+    )
+
+    headers = {}
+    if len(rows) == limit:
+        last = rows[-1]
+        headers["X-Next-Cursor"] = _encode_cursor(last.date, last.id)
+
+    return responses.rows_response(rows, schemas.SaleRows, headers=headers)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+@router.get("/export")
+async def export_sales(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    gzip: bool = False,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user: models.User = Depends(get_current_active_paid_user),
+):
+    # Full sales ledger with product name, cost and margin, oldest first
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    user_id = current_user.id
+
+    async def generate():
+        # Own session: the request-scoped one may be closed while we are still streaming
+        async with shards.tenant_session(user_id, read=True) as db:
+            partitions = crud.stream_sales(db, user_id, start_date=start_date, end_date=end_date)
+            chunks = export.encode_parquet(partitions) if format == "parquet" else export.encode_text(partitions, format)
+            if gzip:
+                chunks = export.gzip_chunks(chunks)
+            async for chunk in chunks:
+                yield chunk
 
-        response = []
-        for sale in sales:
-            product = start_products.get(sale.product_id)
-            response.append(schemas.SaleResponse(
-                id=sale.id,
-                product_name=product.name if product else "Unknown",
-                quantity_sold=sale.quantity_sold,
-                total_amount=sale.total_amount,
-                date=sale.date
-            ))
-        return response
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    filename = f"sales.{format}.gz" if gzip else f"sales.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
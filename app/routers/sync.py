@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from .. import schemas, database, models, crud, responses
+from ..routers.auth import get_current_active_paid_user
+
+# Delta sync for counters that work offline: pull what changed since the last
+# sync instead of reloading /inventory/ and /sales/, push sales queued offline.
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sync"],
+    dependencies=[Depends(get_current_active_paid_user)]
+)
+
+MAX_OFFLINE_SALES = 500
+PRODUCT_COLUMNS = ["id", "name", "cost_price", "selling_price", "stock_quantity"]
+SALE_COLUMNS = ["id", "client_id", "product_id", "quantity_sold", "total_amount", "date"]
+
+def _encode_cursor(version: int, kind: int, row_id: int) -> str:
+    return f"{version}.{kind}.{row_id}"
+
+def _decode_cursor(cursor: str):
+    # A bare version (what a finished sync hands back) means "after all of it"
+    try:
+        parts = [int(part) for part in cursor.split(".")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(parts) == 1:
+        return parts[0], crud.SYNC_SALES + 1, 0
+    if len(parts) != 3:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(parts)
+
+@router.get("")
+async def get_changes(
+    since: str = Query("0"),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: models.User = Depends(get_current_active_paid_user),
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Products and sales changed after `since`, plus ids of deleted products,
+    # as column lists and row arrays. Apply them, store `next` and call again
+    # with since=next while `more` is true. Start from 0 for a full download.
+    changes = await crud.get_changes(db=db, user_id=current_user.id, since=_decode_cursor(since), limit=limit)
+    body = {
+        "next": _encode_cursor(*changes["last"]) if changes["more"] else str(changes["version"]),
+        "more": changes["more"],
+        "products": {"columns": PRODUCT_COLUMNS, "rows": [list(row) for row in changes["products"]]},
+        "deleted_products": changes["deleted_products"],
+        "sales": {"columns": SALE_COLUMNS, "rows": [list(row) for row in changes["sales"]]},
+    }
+    return Response(content=responses.dumps(body), media_type="application/json")
+
+@router.post("/sales", response_model=List[schemas.OfflineSaleResult])
+async def upload_offline_sales(items: List[schemas.OfflineSaleCreate], current_user: models.User = Depends(get_current_active_paid_user), db: AsyncSession = Depends(database.get_db)):
+    # Safe to retry: a client_id that was already recorded comes back as
+    # "duplicate" with its sale id. Lines are accepted or rejected one by one.
+    if not items:
+        raise HTTPException(status_code=400, detail="No sales to upload")
+    if len(items) > MAX_OFFLINE_SALES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_OFFLINE_SALES} sales per upload")
+    try:
+        return await crud.create_offline_sales(db=db, items=items, user_id=current_user.id)
+    except crud.OfflineSalesConflict:
+        raise HTTPException(status_code=409, detail="Stock changed during upload, retry", headers={"Retry-After": "1"})
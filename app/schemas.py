@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
 from typing import Optional, List
+from typing_extensions import TypedDict
 from datetime import datetime
 
 # User Schemas
@@ -42,10 +43,18 @@ class ProductResponse(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductRow(TypedDict):
+    id: int
+    user_id: int
+    name: str
+    cost_price: float
+    selling_price: float
+    stock_quantity: int
+
 # Sale Schemas
 class SaleCreate(BaseModel):
     product_id: int
-    quantity: int # Input usually just calls it quantity, mapped to quantity_sold in DB
+    quantity: int = Field(gt=0) # Input usually just calls it quantity, mapped to quantity_sold in DB
 
 class SaleResponse(BaseModel):
     id: int
@@ -57,6 +66,32 @@ class SaleResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Offline sync: sales queued on a counter while it had no connection. The
+# client_id is generated on the device, so an upload can be retried safely.
+class OfflineSaleCreate(BaseModel):
+    client_id: str = Field(min_length=1, max_length=64)
+    product_id: int
+    quantity: int = Field(gt=0)
+    sold_at: Optional[datetime] = None # when the sale happened on the device; defaults to upload time
+
+class OfflineSaleResult(BaseModel):
+    client_id: str
+    status: str # created, duplicate or rejected
+    sale_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SaleRow(TypedDict):
+    id: int
+    product_name: str
+    quantity_sold: int
+    total_amount: float
+    date: datetime
+
+# List endpoints serialize DB rows against these directly (no model instances,
+# no second validation pass). Keep them in step with the *Response models.
+ProductRows = TypeAdapter(List[ProductRow])
+SaleRows = TypeAdapter(List[SaleRow])
+
 # Payment/Transaction Schemas
 class PaymentInitiate(BaseModel):
     amount: float = 1000.0
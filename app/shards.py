@@ -0,0 +1,94 @@
+import contextlib
+import time
+from typing import NamedTuple
+from sqlalchemy import select, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import database, models, replicas
+from .config import settings
+
+# Which shard holds a tenant, from the directory on shard 0 (tenant_shards).
+# Each worker caches a lookup for SHARD_MAP_CACHE_TTL_SECONDS, so a directory
+# change reaches every worker within that time; app.tenant_move waits that
+# long before it relies on one. With a single shard nothing is looked up.
+
+ACTIVE = "active"
+MOVING = "moving"
+
+class Placement(NamedTuple):
+    shard: int
+    state: str
+
+DEFAULT_PLACEMENT = Placement(0, ACTIVE)
+
+_cache: dict[int, tuple[float, Placement]] = {}
+
+def sharded() -> bool:
+    return len(database.shards) > 1
+
+async def lookup(db: AsyncSession, user_id: int, cached: bool = True) -> Placement:
+    # Through a session the caller already has: a second one per request could
+    # wait forever on a pool whose connections are all held by first ones
+    if not sharded():
+        return DEFAULT_PLACEMENT
+    now = time.monotonic()
+    entry = _cache.get(user_id) if cached else None
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    result = await db.execute(
+        select(models.TenantShard.shard, models.TenantShard.state).where(models.TenantShard.user_id == user_id)
+    )
+    row = result.first()
+    placement = Placement(row.shard, row.state) if row is not None else DEFAULT_PLACEMENT
+    _cache.pop(user_id, None)
+    _cache[user_id] = (now + settings.SHARD_MAP_CACHE_TTL_SECONDS, placement)
+    while len(_cache) > settings.SHARD_DIRECTORY_CACHE_SIZE:
+        _cache.pop(next(iter(_cache)))
+    return placement
+
+def forget(user_id: int):
+    _cache.pop(user_id, None)
+
+async def bind(user_id: int, db: AsyncSession, read_db: AsyncSession):
+    # Route a request's sessions to the tenant's shard. Writes are refused
+    # (database.TenantMoving) while the tenant is being moved.
+    placement = await lookup(read_db, user_id)
+    for session in (db, read_db):
+        database.bind_tenant(session, placement.shard, frozen=placement.state == MOVING)
+
+@contextlib.asynccontextmanager
+async def tenant_session(user_id: int, read: bool = False):
+    # A session of its own on the tenant's shard, e.g. for a streamed export
+    session = database.ReadSessionLocal() if read else database.SessionLocal()
+    async with session:
+        placement = await lookup(session, user_id)
+        database.bind_tenant(session, placement.shard, frozen=placement.state == MOVING)
+        if read:
+            await replicas.route_reads(user_id, session)
+        yield session
+
+def _insert_ignore(dialect_name: str, table, **values):
+    stmt = (postgresql.insert if dialect_name == "postgresql" else sqlite.insert)(table).values(**values)
+    return stmt.on_conflict_do_nothing()
+
+async def ensure_user_row(shard: int, user_id: int):
+    # Tenant tables reference users.id. Shards other than 0 get a bare row with
+    # just the id to satisfy that; the real user stays on shard 0.
+    if shard == 0:
+        return
+    db_engine = database.shards[shard].engine
+    async with db_engine.begin() as conn:
+        await conn.execute(_insert_ignore(conn.dialect.name, models.User.__table__, id=user_id))
+
+async def place_new_tenant(db: AsyncSession, user_id: int) -> int:
+    # New tenants are spread over the shards by id; the directory row pins them,
+    # so adding shards later doesn't move anyone. Part of the caller's
+    # transaction, which commits it together with the new user; the caller
+    # runs ensure_user_row once that has committed, so a failed registration
+    # leaves nothing behind on the tenant's shard.
+    if not sharded():
+        return 0
+    shard = user_id % len(database.shards)
+    await db.execute(insert(models.TenantShard).values(user_id=user_id, shard=shard, state=ACTIVE))
+    forget(user_id)
+    return shard
@@ -0,0 +1,47 @@
+import hashlib
+import os
+from starlette.staticfiles import StaticFiles
+
+# /static with content-hashed URLs. Templates link "css/app.<hash>.css" via
+# static_url(); the hashed name maps back to the real file and is cached for a
+# year, since any change to the file changes its URL. Unhashed paths still work
+# but must revalidate (StaticFiles answers If-None-Match with a 304).
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+class FingerprintedStaticFiles(StaticFiles):
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.directory_path = directory
+        self.hashed_to_path: dict[str, str] = {}
+        self.path_to_hashed: dict[str, str] = {}
+        self.build_manifest()
+
+    def build_manifest(self):
+        hashed_to_path = {}
+        path_to_hashed = {}
+        for root, _, files in os.walk(self.directory_path):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.directory_path).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:12]
+                stem, ext = os.path.splitext(path)
+                hashed = f"{stem}.{digest}{ext}"
+                hashed_to_path[hashed] = path
+                path_to_hashed[path] = hashed
+        self.hashed_to_path = hashed_to_path
+        self.path_to_hashed = path_to_hashed
+
+    def url(self, path: str) -> str:
+        return "/static/" + self.path_to_hashed.get(path, path)
+
+    async def get_response(self, path: str, scope):
+        real_path = self.hashed_to_path.get(path.replace(os.sep, "/"))
+        response = await super().get_response(real_path or path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if real_path else REVALIDATE
+        return response
+
+static_files = FingerprintedStaticFiles(directory="static")
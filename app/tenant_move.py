@@ -0,0 +1,245 @@
+"""Move a tenant's data to another shard while it keeps working.
+
+    python -m app.tenant_move <user_id> <target_shard> [--keep-source]
+
+1. Copy: every tenant row is copied to the target while the tenant keeps
+   reading and writing on its current shard.
+2. Catch up: rows written meanwhile are found by their change version (see
+   crud.change_version) and copied again, until little is left.
+3. Freeze: the directory marks the tenant "moving". Once every worker has seen
+   that (SHARD_MAP_CACHE_TTL_SECONDS plus a grace period for requests in
+   flight), writes get a 503 and reads still come from the old shard.
+4. Final catch-up. Then verify: every table's rows must hash the same on both
+   shards, and the old shard's version must not have moved since the freeze.
+5. Switch: the directory points at the target. After another cache period the
+   old shard's copy is deleted, unless --keep-source.
+
+Any failure before the switch unfreezes the tenant where it was. Leftovers on
+the target are cleared at the start of the next attempt.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import crud, database, models, shards
+from .config import settings
+
+logger = logging.getLogger("app.tenant_move")
+
+# Parents first; deleted in reverse. Rollups and data_versions carry no change
+# version, so the final catch-up refreshes them from the sales that changed.
+VERSIONED = (models.Product, models.ProductTombstone, models.Sale)
+TABLES = (models.Product, models.ProductTombstone, models.Sale, models.DailyPnl, models.ProductDailyPnl, models.DataVersion)
+
+COPY_CHUNK_SIZE = 1000
+CATCH_UP_ROUNDS = 5
+CATCH_UP_ENOUGH = 100 # rows left over that are fine to copy while frozen
+
+class MoveError(Exception):
+    pass
+
+def _upsert(dialect_name: str, model):
+    table = model.__table__
+    stmt = (postgresql.insert if dialect_name == "postgresql" else sqlite.insert)(table)
+    keys = [column.name for column in table.primary_key.columns]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column.name: stmt.excluded[column.name] for column in table.columns if column.name not in keys}
+    )
+
+def _tenant_rows(model, user_id: int):
+    table = model.__table__
+    return select(table).where(table.c.user_id == user_id).order_by(*table.primary_key.columns)
+
+async def _copy(source: database.Shard, target: database.Shard, model, stmt) -> int:
+    # Streams from the source's read engine, one target transaction per chunk so
+    # the target shard's other tenants aren't locked out for the whole copy
+    copied = 0
+    async with source.read_engine.connect() as source_conn:
+        result = await source_conn.stream(stmt)
+        async for rows in result.partitions(COPY_CHUNK_SIZE):
+            async with target.engine.begin() as target_conn:
+                await target_conn.execute(_upsert(target_conn.dialect.name, model), [row._asdict() for row in rows])
+            copied += len(rows)
+    return copied
+
+async def _data_version(shard: database.Shard, user_id: int) -> int:
+    async with shard.engine.connect() as conn:
+        result = await conn.execute(select(models.DataVersion.version).where(models.DataVersion.user_id == user_id))
+        return result.scalar() or 0
+
+async def _delete_tenant(shard: database.Shard, user_id: int):
+    async with shard.engine.begin() as conn:
+        for model in reversed(TABLES):
+            await conn.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+
+async def _has_rows(shard: database.Shard, user_id: int) -> bool:
+    async with shard.engine.connect() as conn:
+        for model in TABLES:
+            result = await conn.execute(select(model.__table__.c.user_id).where(model.__table__.c.user_id == user_id).limit(1))
+            if result.first() is not None:
+                return True
+    return False
+
+async def _catch_up(source: database.Shard, target: database.Shard, user_id: int, since: int, until: int) -> int:
+    # Rows whose last write is in (since, until]. Deleted products go first, so a
+    # new product can take a deleted one's name.
+    tombstones = models.ProductTombstone
+    async with source.read_engine.connect() as conn:
+        result = await conn.execute(
+            select(tombstones.product_id).where(
+                tombstones.user_id == user_id, tombstones.version > since, tombstones.version <= until
+            )
+        )
+        deleted = result.scalars().all()
+    if deleted:
+        async with target.engine.begin() as conn:
+            await conn.execute(delete(models.Product.__table__).where(models.Product.__table__.c.id.in_(deleted)))
+    copied = len(deleted)
+    for model in VERSIONED:
+        table = model.__table__
+        stmt = _tenant_rows(model, user_id).where(table.c.version > since, table.c.version <= until)
+        copied += await _copy(source, target, model, stmt)
+    return copied
+
+async def _refresh_rollups(source: database.Shard, target: database.Shard, user_id: int, since: int):
+    # A rollup row only changes when a sale for its day is recorded, so the days
+    # of the sales written after `since` are the ones to copy again
+    async with source.read_engine.connect() as conn:
+        result = await conn.execute(
+            select(models.Sale.date).where(models.Sale.user_id == user_id, models.Sale.version > since)
+        )
+        dates = result.scalars().all()
+    days = {
+        models.DailyPnl: {sale_date.date() for sale_date in dates},
+        models.ProductDailyPnl: {crud.local_day(sale_date) for sale_date in dates},
+    }
+    for model, model_days in days.items():
+        if not model_days:
+            continue
+        table = model.__table__
+        async with target.engine.begin() as conn:
+            await conn.execute(delete(table).where(table.c.user_id == user_id, table.c.day.in_(model_days)))
+        await _copy(source, target, model, _tenant_rows(model, user_id).where(table.c.day.in_(model_days)))
+    await _copy(source, target, models.DataVersion, _tenant_rows(models.DataVersion, user_id))
+
+async def _digest(shard: database.Shard, model, user_id: int) -> tuple[int, str]:
+    count, digest = 0, hashlib.sha256()
+    async with shard.engine.connect() as conn:
+        result = await conn.stream(_tenant_rows(model, user_id))
+        async for rows in result.partitions(COPY_CHUNK_SIZE):
+            for row in rows:
+                digest.update(repr(tuple(row)).encode())
+            count += len(rows)
+    return count, digest.hexdigest()
+
+async def verify(source: database.Shard, target: database.Shard, user_id: int) -> dict:
+    # Row count per table; raises MoveError if any table differs
+    counts = {}
+    for model in TABLES:
+        expected = await _digest(source, model, user_id)
+        actual = await _digest(target, model, user_id)
+        if expected != actual:
+            raise MoveError(
+                f"{model.__tablename__} differs after copy: {expected[0]} rows on shard {source.index}, "
+                f"{actual[0]} on shard {target.index}"
+            )
+        counts[model.__tablename__] = expected[0]
+    return counts
+
+async def _set_placement(user_id: int, shard: int, state: str):
+    async with database.SessionLocal() as db:
+        stmt = crud._upsert(db)(models.TenantShard).values(user_id=user_id, shard=shard, state=state)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.TenantShard.user_id],
+            set_={"shard": stmt.excluded.shard, "state": stmt.excluded.state}
+        ))
+        await db.commit()
+    shards.forget(user_id)
+
+async def move_tenant(user_id: int, target_index: int, keep_source: bool = False, grace_seconds: float = 2.0) -> dict:
+    if not 0 <= target_index < len(database.shards):
+        raise MoveError(f"No shard {target_index}; configured: 0..{len(database.shards) - 1}")
+    async with database.SessionLocal() as db:
+        placement = await shards.lookup(db, user_id, cached=False)
+    if placement.state != shards.ACTIVE:
+        raise MoveError(f"User {user_id} is already being moved (state {placement.state!r})")
+    if placement.shard == target_index:
+        raise MoveError(f"User {user_id} is already on shard {target_index}")
+    source, target = database.shards[placement.shard], database.shards[target_index]
+    settle = settings.SHARD_MAP_CACHE_TTL_SECONDS + grace_seconds
+    report = {"user_id": user_id, "source": source.index, "target": target.index}
+
+    if await _has_rows(target, user_id):
+        logger.info("Clearing leftovers of an earlier attempt on shard %d", target.index)
+        await _delete_tenant(target, user_id)
+    await shards.ensure_user_row(target.index, user_id)
+
+    # 1-2. Online copy, then catch up on what changed meanwhile
+    start = time.perf_counter()
+    copy_start = await _data_version(source, user_id)
+    report["copied"] = {model.__tablename__: await _copy(source, target, model, _tenant_rows(model, user_id)) for model in TABLES}
+    copied_to = copy_start
+    for round_number in range(CATCH_UP_ROUNDS):
+        current = await _data_version(source, user_id)
+        changed = await _catch_up(source, target, user_id, copied_to, current)
+        copied_to = current
+        logger.info("Catch-up round %d: %d rows", round_number + 1, changed)
+        if changed <= CATCH_UP_ENOUGH:
+            break
+    report["copy_seconds"] = round(time.perf_counter() - start, 3)
+
+    # 3. Freeze writes and wait until every worker has noticed
+    await _set_placement(user_id, source.index, shards.MOVING)
+    frozen_at = time.perf_counter()
+    try:
+        logger.info("Writes frozen; waiting %.1fs for workers to notice", settle)
+        await asyncio.sleep(settle)
+
+        # 4. Final catch-up and verification
+        frozen_version = await _data_version(source, user_id)
+        await _catch_up(source, target, user_id, copied_to, frozen_version)
+        await _refresh_rollups(source, target, user_id, copy_start)
+        report["rows"] = await verify(source, target, user_id)
+        if await _data_version(source, user_id) != frozen_version:
+            raise MoveError("The source changed while writes were frozen; retry with a longer --grace")
+    except BaseException:
+        await _set_placement(user_id, source.index, shards.ACTIVE)
+        raise
+
+    # 5. Switch, then drop the old copy once no worker can still be reading it
+    await _set_placement(user_id, target.index, shards.ACTIVE)
+    report["frozen_seconds"] = round(time.perf_counter() - frozen_at, 3)
+    logger.info("User %d now on shard %d", user_id, target.index)
+    if not keep_source:
+        await asyncio.sleep(settle)
+        if await _data_version(source, user_id) != frozen_version:
+            raise MoveError(f"Shard {source.index} was written after the switch; its copy is kept for inspection")
+        await _delete_tenant(source, user_id)
+        if source.index != 0:
+            async with source.engine.begin() as conn:
+                await conn.execute(delete(models.User.__table__).where(models.User.__table__.c.id == user_id))
+        report["source_deleted"] = True
+    return report
+
+async def _main(args):
+    try:
+        report = await move_tenant(args.user_id, args.target_shard, keep_source=args.keep_source, grace_seconds=args.grace)
+    finally:
+        await database.dispose_engines()
+    for key, value in report.items():
+        logger.info("%s: %s", key, value)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s [%(name)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Move a tenant's data to another shard")
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("target_shard", type=int)
+    parser.add_argument("--keep-source", action="store_true", help="leave the old shard's copy in place")
+    parser.add_argument("--grace", type=float, default=2.0, help="seconds allowed for requests in flight at the freeze")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,61 @@
+import os
+import secrets
+import threading
+import time
+
+# Transaction references for the payment gateway: "T" + 19 Crockford base32
+# characters = 20, the gateway's pp_TxnRefNo limit. The 95 bits are
+#   48 bits  milliseconds since the Unix epoch (sortable, good for millennia)
+#   12 bits  per-process sequence within the millisecond
+#   22 bits  process id (unique among the gunicorn workers on a host)
+#   13 bits  random, fixed per process (separates hosts / reused pids)
+# References from one process are strictly increasing, even if the clock
+# steps back or a millisecond's 4096 sequence numbers run out.
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+PREFIX = "T"
+LENGTH = 19
+
+class TxnRefGenerator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+        self._pid = None
+        self._node = 0
+
+    def _node_bits(self):
+        # Recomputed after fork so pre-forked workers don't share a node id
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._node = ((pid & 0x3FFFFF) << 13) | secrets.randbits(13)
+            self._last_ms = 0
+            self._sequence = 0
+        return self._node
+
+    def new(self) -> str:
+        with self._lock:
+            node = self._node_bits()
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > 0xFFF:
+                    # Borrow the next millisecond rather than wait or repeat
+                    self._last_ms += 1
+                    self._sequence = 0
+            value = (self._last_ms << 47) | (self._sequence << 35) | node
+
+        chars = []
+        for _ in range(LENGTH):
+            value, index = divmod(value, 32)
+            chars.append(ALPHABET[index])
+        return PREFIX + "".join(reversed(chars))
+
+generator = TxnRefGenerator()
+
+def new_txn_ref() -> str:
+    return generator.new()
@@ -0,0 +1,67 @@
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import context
+
+from app.config import settings
+from app.database import Base
+from app import models # noqa: F401 (registers the tables on Base.metadata)
+
+config = context.config
+
+# app.migrate configures logging itself and passes configure_logger=False
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Search indexes live only in migration 0002 (FTS5 on SQLite, pg_trgm on Postgres)
+SEARCH_OBJECTS = ("products_fts", "ix_products_name_trgm")
+
+def include_object(obj, name, type_, reflected, compare_to):
+    return not (reflected and name and name.startswith(SEARCH_OBJECTS))
+
+def _url():
+    return config.attributes.get("url") or settings.DATABASE_URL
+
+def run_migrations_offline() -> None:
+    # `alembic upgrade head --sql`: emit the DDL instead of running it
+    context.configure(
+        url=_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=_url().startswith("sqlite"),
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection: Connection) -> None:
+    # SQLite can't ALTER most things in place; batch mode rebuilds the table instead
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(_url(), poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+def run_migrations_online() -> None:
+    asyncio.run(run_async_migrations())
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
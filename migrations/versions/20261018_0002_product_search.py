@@ -0,0 +1,72 @@
+"""product search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 17:40:00.000000
+
+Both: an index on (user_id, lower(name)) for case-insensitive prefix lookups.
+SQLite: an external-content FTS5 table over products.name with the trigram
+tokenizer, kept in sync by triggers (so inserts, updates, upserts and deletes
+from any code path are covered), plus an fts5vocab view of per-trigram
+document counts. Postgres: a pg_trgm GIN index on products.name, maintained
+like any other index.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # if_not_exists: legacy databases adopted by app.migrate already got it from the models
+    op.create_index("ix_products_user_lower_name", "products", ["user_id", sa.text("lower(name)")], if_not_exists=True)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE products_fts USING fts5("
+            "name, content='products', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute("""
+            CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER products_fts_update AFTER UPDATE OF name ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+            END
+        """)
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        op.execute("CREATE VIRTUAL TABLE products_fts_vocab USING fts5vocab(products_fts, 'row')")
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("DROP TABLE IF EXISTS products_fts_vocab")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_insert")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    op.drop_index("ix_products_user_lower_name", table_name="products")
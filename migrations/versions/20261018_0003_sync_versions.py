@@ -0,0 +1,75 @@
+"""change versions for delta sync
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 18:30:00.000000
+
+products and sales get the tenant change version of their last write, sales
+an optional client_id (unique per tenant) for idempotent offline uploads, and
+deleted products a tombstone. Existing rows are stamped with their tenant's
+current version, so a first sync from version 0 returns everything.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_tombstones',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('product_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_product_tombstones_user_version', ['user_id', 'version', 'product_id'], unique=False)
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_products_user_version', ['user_id', 'version', 'id'], unique=False)
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('client_id', sa.String(), nullable=True))
+        batch_op.create_index('ix_sales_user_version', ['user_id', 'version', 'id'], unique=False)
+        batch_op.create_index('ix_sales_user_client_id', ['user_id', 'client_id'], unique=True)
+
+    # Every tenant with data gets a version >= 1 and its rows are stamped with it
+    op.execute("""
+        INSERT INTO data_versions (user_id, version)
+        SELECT id, 1 FROM users
+        WHERE id NOT IN (SELECT user_id FROM data_versions)
+          AND (EXISTS (SELECT 1 FROM products WHERE products.user_id = users.id)
+               OR EXISTS (SELECT 1 FROM sales WHERE sales.user_id = users.id))
+    """)
+    op.execute("UPDATE data_versions SET version = 1 WHERE version IS NULL OR version < 1")
+    for table in ("products", "sales"):
+        op.execute(f"""
+            UPDATE {table} SET version = COALESCE(
+                (SELECT version FROM data_versions WHERE data_versions.user_id = {table}.user_id), 0
+            )
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Plain DROP COLUMN (SQLite >= 3.35), not a batch table rebuild: a rebuild
+    # would lose the products FTS triggers and the lower(name) expression index
+    op.drop_index('ix_sales_user_client_id', table_name='sales')
+    op.drop_index('ix_sales_user_version', table_name='sales')
+    op.drop_column('sales', 'client_id')
+    op.drop_column('sales', 'version')
+    op.drop_index('ix_products_user_version', table_name='products')
+    op.drop_column('products', 'version')
+    op.drop_index('ix_product_tombstones_user_version', table_name='product_tombstones')
+    op.drop_table('product_tombstones')
@@ -0,0 +1,38 @@
+"""sale unit cost snapshot
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 10:00:00.000000
+
+sales get the product's cost price at the time of sale, so the rollups can be
+rebuilt and the ledger exported without picking up later cost edits. Older
+sales never recorded one; they are stamped with the current cost price, the
+same value a rebuild used for them until now.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sales', sa.Column('unit_cost', sa.Float(), nullable=True))
+    op.execute("""
+        UPDATE sales SET unit_cost = COALESCE(
+            (SELECT cost_price FROM products WHERE products.id = sales.product_id), 0.0
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Plain DROP COLUMN, see 0003
+    op.drop_column('sales', 'unit_cost')
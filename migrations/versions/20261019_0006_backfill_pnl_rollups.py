@@ -0,0 +1,76 @@
+"""backfill P&L rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 12:00:00.000000
+
+daily_pnl and product_daily_pnl are only maintained as sales are recorded, so
+a database adopted from before they existed has them empty and every report
+shows 0 for its history. Rebuild both from the sales table, with each sale's
+unit_cost snapshot (0005), the same way rebuild_pnl.py does.
+"""
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.crud import local_day, _bucket_dates
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK_SIZE = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # SQLite stores datetimes as text, CAST(... AS DATE) would truncate to the year
+    day = "date(date)" if bind.dialect.name == "sqlite" else "CAST(date AS DATE)"
+    op.execute("DELETE FROM daily_pnl")
+    op.execute(f"""
+        INSERT INTO daily_pnl (user_id, day, revenue, cost, units_sold, sales_count)
+        SELECT user_id, {day}, SUM(total_amount), SUM(quantity_sold * COALESCE(unit_cost, 0.0)),
+               SUM(quantity_sold), COUNT(id)
+        FROM sales WHERE date IS NOT NULL GROUP BY user_id, {day}
+    """)
+
+    # Local-day buckets need a timezone database, which SQLite doesn't have
+    sales = sa.table(
+        'sales', sa.column('user_id'), sa.column('product_id'), sa.column('date', sa.DateTime()),
+        sa.column('total_amount'), sa.column('quantity_sold'), sa.column('unit_cost')
+    )
+    totals = defaultdict(lambda: [0.0, 0.0, 0, 0])
+    for row in bind.execute(sa.select(sales).where(sales.c.date.isnot(None))):
+        entry = totals[(row.user_id, local_day(row.date), row.product_id or 0)]
+        entry[0] += row.total_amount or 0.0
+        entry[1] += (row.quantity_sold or 0) * (row.unit_cost or 0.0)
+        entry[2] += row.quantity_sold or 0
+        entry[3] += 1
+
+    op.execute("DELETE FROM product_daily_pnl")
+    product_daily_pnl = sa.table(
+        'product_daily_pnl', sa.column('user_id'), sa.column('day', sa.Date()), sa.column('product_id'),
+        sa.column('week', sa.Date()), sa.column('month', sa.Date()), sa.column('revenue'), sa.column('cost'),
+        sa.column('units_sold'), sa.column('sales_count')
+    )
+    rows = [
+        {
+            "user_id": user_id, "day": sale_day, "product_id": product_id, **_bucket_dates(sale_day),
+            "revenue": revenue, "cost": cost, "units_sold": units, "sales_count": count
+        }
+        for (user_id, sale_day, product_id), (revenue, cost, units, count) in totals.items()
+    ]
+    for start in range(0, len(rows), CHUNK_SIZE):
+        op.bulk_insert(product_daily_pnl, rows[start:start + CHUNK_SIZE])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Data only; the rollups stay as they are
+    pass
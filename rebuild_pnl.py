@@ -0,0 +1,28 @@
+import asyncio
+import sys
+
+from app.database import SessionLocal, bind_tenant, shards as all_shards
+from app import crud, shards
+
+# Backfill / rebuild the daily_pnl and product_daily_pnl rollups from the sales table.
+# Usage: python rebuild_pnl.py [user_id]  (after `python -m app.migrate`)
+
+async def rebuild_pnl(user_id: int | None = None):
+    if user_id is not None:
+        async with shards.tenant_session(user_id) as db:
+            await crud.rebuild_daily_pnl(db, user_id=user_id)
+            await crud.rebuild_product_daily_pnl(db, user_id=user_id)
+    else:
+        # Every shard rebuilds the tenants it holds
+        for shard in all_shards:
+            async with SessionLocal() as db:
+                bind_tenant(db, shard.index)
+                await crud.rebuild_daily_pnl(db)
+                await crud.rebuild_product_daily_pnl(db)
+
+    target = f"user {user_id}" if user_id is not None else "all users"
+    print(f"Rebuilt daily P&L rollups for {target}.")
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    asyncio.run(rebuild_pnl(user_id))
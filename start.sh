@@ -5,5 +5,5 @@ set -o errexit
 # Install dependencies from the Render-specific requirements file
 pip install -r requirements-render.txt
 
-# Run migrations (if you have them, uncomment below)
-# alembic upgrade head
+# Migrations run at deploy start, once, before gunicorn forks workers
+# (see startCommand in render.yaml): python -m app.migrate
@@ -0,0 +1,64 @@
+// Global Auth Check
+const token = localStorage.getItem('access_token');
+if (!token && window.location.pathname !== '/login' && window.location.pathname !== '/signup') {
+    window.location.href = '/login';
+}
+
+function logout() {
+    localStorage.removeItem('access_token');
+    window.location.href = '/login';
+}
+
+// Add Bearer token to all AJAX requests
+$.ajaxSetup({
+    beforeSend: function (xhr) {
+        if (token) {
+            xhr.setRequestHeader('Authorization', 'Bearer ' + token);
+        }
+    },
+    error: function (xhr) {
+        if (xhr.status === 401) {
+            logout();
+        }
+    }
+});
+
+// Live changes for this shop from /events (server-sent events). Pages patch
+// their tables in place from `onChange`; `onResync` reloads everything, which
+// the server asks for after bulk imports, and which is needed after a
+// reconnect since events sent while disconnected are lost.
+// The stream is opened with a short-lived token from POST /events/token, so
+// the API token never appears in a URL. On any error the stream is reopened
+// with a fresh one; if the session itself has expired, that request's 401
+// sends the user to the login page.
+function subscribeChanges(onChange, onResync) {
+    if (!token || !window.EventSource) return;
+    let opened = false;
+
+    function connect() {
+        $.post('/events/token').done(function (res) {
+            const source = new EventSource('/events?token=' + encodeURIComponent(res.token));
+            source.onopen = function () {
+                if (opened) onResync();
+                opened = true;
+            };
+            source.onmessage = function (e) {
+                const change = JSON.parse(e.data);
+                if (change.type === 'resync') {
+                    onResync();
+                } else {
+                    onChange(change);
+                }
+            };
+            // The browser would retry with the same, possibly expired, token
+            source.onerror = function () {
+                source.close();
+                setTimeout(connect, 3000);
+            };
+        }).fail(function (xhr) {
+            if (xhr.status !== 401) setTimeout(connect, 3000);
+        });
+    }
+
+    connect();
+}
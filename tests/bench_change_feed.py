@@ -0,0 +1,122 @@
+"""Benchmark: memory per idle change-feed subscriber, and fan-out latency.
+
+    python tests/bench_change_feed.py --subscribers 5000
+
+Starts one uvicorn worker on a throwaway SQLite file (or DATABASE_URL), opens
+--subscribers GET /events connections for a single tenant (the worst case for
+fan-out), and reports the worker's resident memory per idle connection. Then
+records one sale and measures how long until every connection has the event,
+and checks that closing the connections unsubscribes them all. Linux only
+(reads the worker's RSS from /proc).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='hisabpro-bench-')}/bench.db"
+
+import httpx
+
+from app import migrate
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmRSS not found")
+
+async def subscribe(port: int, token: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /events?token={token} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await reader.readuntil(b"retry: 3000\n\n")
+    return reader, writer
+
+async def wait_for_sale(reader, start: float) -> float:
+    await reader.readuntil(b'"type":"sale.created"')
+    return time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    await asyncio.to_thread(migrate.upgrade)
+    port = free_port()
+    env = {**os.environ, "PAYMENT_WORKER_ENABLED": "false", "DEBUG": "false", "METRICS_ENABLED": "true"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            await client.post("/register", json={"name": "Bench", "email": "bench@example.com", "phone": "0300", "password": "password123"})
+            r = await client.post("/token", data={"username": "bench@example.com", "password": "password123"})
+            token = r.json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            r = await client.post("/inventory/", json={"name": "Bench Item", "cost_price": 5, "selling_price": 10, "stock_quantity": 1000}, headers=headers)
+            product_id = r.json()["id"]
+            events_token = (await client.post("/events/token", headers=headers)).json()["token"]
+
+            # Warm up the code paths once so the baseline includes them
+            _, writer = await subscribe(port, events_token)
+            writer.close()
+            await asyncio.sleep(0.5)
+            baseline = rss_mb(server.pid)
+
+            connections = []
+            start = time.perf_counter()
+            for i in range(0, args.subscribers, args.batch):
+                connections += await asyncio.gather(*[
+                    subscribe(port, events_token) for _ in range(min(args.batch, args.subscribers - i))
+                ])
+            connect_seconds = time.perf_counter() - start
+            await asyncio.sleep(1)
+            loaded = rss_mb(server.pid)
+            stats = (await client.get("/health/events")).json()
+
+            start = time.perf_counter()
+            pending = [asyncio.create_task(wait_for_sale(reader, start)) for reader, _ in connections]
+            r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            r.raise_for_status()
+            latencies = sorted(await asyncio.gather(*pending))
+
+            for _, writer in connections:
+                writer.close()
+            await asyncio.sleep(1)
+            after_close = (await client.get("/health/events")).json()
+
+        n = len(connections)
+        print(f"subscribers            {n} (server counts {stats['subscribers']})")
+        print(f"connect time           {connect_seconds:.2f} s")
+        print(f"worker RSS             {baseline:.1f} MB idle -> {loaded:.1f} MB with subscribers")
+        print(f"memory per subscriber  {(loaded - baseline) * 1024 / n:.1f} KB")
+        print(f"fan-out of one sale    p50 {latencies[n // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+        print(f"after disconnect       {after_close['subscribers']} subscribers left")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""Benchmark: columnar (NumPy) daily report vs the SQL GROUP BY + Python loop path.
+
+    python tests/bench_columnar.py --sizes 100000,1000000,10000000
+
+Seeds a single tenant in a throwaway SQLite file (or DATABASE_URL) and grows
+it to each size in turn, timing both paths end to end including JSON encoding.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='hisabpro-bench-')}/bench.db"
+
+from sqlalchemy import insert, func
+from sqlalchemy.future import select
+
+from app.database import SessionLocal, engine
+from app import columnar, migrate, models
+
+PRODUCTS = 200
+
+async def seed_sales(user_id: int, count: int, chunk: int = 20000):
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        for start in range(0, count, chunk):
+            size = min(chunk, count - start)
+            await db.execute(insert(models.Sale), [
+                {
+                    "user_id": user_id,
+                    "product_id": random.randint(1, PRODUCTS),
+                    "quantity_sold": random.randint(1, 5),
+                    "total_amount": random.uniform(50, 2000),
+                    "unit_cost": 40.0,
+                    "date": now - timedelta(seconds=random.randint(0, 3 * 365 * 24 * 3600))
+                }
+                for _ in range(size)
+            ])
+            await db.commit()
+
+async def python_loop_report(user_id: int, window: int = 7) -> bytes:
+    # The same report the SQL + Python loop way: GROUP BY day in SQL (as
+    # /reports/daily did before the rollup), moving average and cumulative
+    # profit in a Python loop, basket sizes via GROUP BY timestamp + sort.
+    async with SessionLocal() as db:
+        stmt = select(
+            func.date(models.Sale.date).label("day"),
+            func.sum(models.Sale.total_amount).label("revenue"),
+            func.sum(models.Sale.quantity_sold * models.Sale.unit_cost).label("cost")
+        ).where(models.Sale.user_id == user_id)\
+            .group_by(func.date(models.Sale.date)).order_by(func.date(models.Sale.date))
+        rows = (await db.execute(stmt)).all()
+        baskets = (await db.execute(
+            select(func.sum(models.Sale.quantity_sold)).where(models.Sale.user_id == user_id).group_by(models.Sale.date)
+        )).scalars().all()
+
+    report = []
+    recent = []
+    cumulative = 0.0
+    for row in rows:
+        revenue = row.revenue or 0.0
+        cost = row.cost or 0.0
+        recent = (recent + [revenue])[-window:]
+        cumulative += revenue - cost
+        report.append({
+            "date": row.day,
+            "revenue": revenue,
+            "cost": cost,
+            "profit": revenue - cost,
+            "revenue_moving_avg": sum(recent) / len(recent),
+            "cumulative_profit": cumulative
+        })
+    baskets.sort()
+    percentiles = {f"p{p}": baskets[min(len(baskets) - 1, len(baskets) * p // 100)] for p in (50, 90, 99)} if baskets else {}
+    return json.dumps({"daily": report, "basket_size_percentiles": percentiles}).encode()
+
+async def columnar_report(user_id: int) -> bytes:
+    async with SessionLocal() as db:
+        arrays = await columnar.load_sales_arrays(db, user_id)
+    return columnar.encode(columnar.daily_report(arrays))
+
+async def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100000,1000000,10000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not columnar.available():
+        sys.exit("numpy is required for the columnar path")
+
+    random.seed(42)
+    await asyncio.to_thread(migrate.upgrade)
+    async with SessionLocal() as db:
+        user = models.User(name="Bench", email="columnar@example.com", phone="0300", password_hash="x", is_paid=True)
+        db.add(user)
+        await db.flush()
+        user_id = user.id
+        await db.execute(insert(models.Product), [
+            {"user_id": user_id, "name": f"Item {i}", "cost_price": 40.0, "selling_price": 60.0, "stock_quantity": 0}
+            for i in range(PRODUCTS)
+        ])
+        await db.commit()
+
+    print(f"{'sales':>12}{'sql+python s':>15}{'columnar s':>13}{'speedup':>9}")
+    seeded = 0
+    for size in (int(s) for s in args.sizes.split(",")):
+        await seed_sales(user_id, size - seeded)
+        seeded = size
+        loop_s = await timed(python_loop_report, user_id, repeat=args.repeat)
+        columnar_s = await timed(columnar_report, user_id, repeat=args.repeat)
+        print(f"{size:>12}{loop_s:>15.3f}{columnar_s:>13.3f}{loop_s / columnar_s:>8.1f}x")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Benchmark: latency and peak memory of the list endpoints on large responses.
+
+    python tests/bench_list_endpoints.py --rows 50000 --repeat 30
+
+Seeds one tenant with --rows products and sales in a throwaway SQLite file (or
+DATABASE_URL), then calls GET /inventory/ (every product in one response) and
+GET /sales/ (pages of 500, the maximum) in-process, reporting p50/p99 latency
+and the peak Python heap allocated during a request (tracemalloc).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='hisabpro-bench-')}/bench.db"
+
+import httpx
+from sqlalchemy import insert
+
+from app.main import app
+from app import migrate
+from app.database import SessionLocal, engine, read_engine
+from app.auth import utils
+from app import models
+
+async def seed(rows: int, chunk: int = 10000):
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        db.add(models.User(name="Bench", email="bench@example.com", phone="0300", password_hash="x", is_paid=True))
+        await db.commit()
+        for start in range(0, rows, chunk):
+            await db.execute(insert(models.Product), [
+                {"user_id": 1, "name": f"Item {i}", "cost_price": 10.0, "selling_price": 15.5, "stock_quantity": 100}
+                for i in range(start, min(rows, start + chunk))
+            ])
+            await db.execute(insert(models.Sale), [
+                {
+                    "user_id": 1,
+                    "product_id": random.randint(1, rows),
+                    "quantity_sold": 2,
+                    "total_amount": 31.0,
+                    "unit_cost": 10.0,
+                    "date": now - timedelta(seconds=i)
+                }
+                for i in range(start, min(rows, start + chunk))
+            ])
+            await db.commit()
+
+async def measure(client, url, params, headers, repeat):
+    latencies = []
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        r = await client.get(url, params=params, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        r.raise_for_status()
+    # tracemalloc slows allocation-heavy code, so take latency from untraced runs too
+    untraced = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await client.get(url, params=params, headers=headers)
+        untraced.append(time.perf_counter() - start)
+    untraced.sort()
+    return {
+        "items": len(r.json()),
+        "p50_ms": untraced[len(untraced) // 2] * 1000,
+        "p99_ms": untraced[min(len(untraced) - 1, int(len(untraced) * 0.99))] * 1000,
+        "peak_mb": max(peaks) / 1e6,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+    random.seed(42)
+
+    await asyncio.to_thread(migrate.upgrade)
+    async with app.router.lifespan_context(app):
+        await seed(args.rows)
+        headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': 'bench@example.com'})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            print(f"{'endpoint':<22}{'items':>8}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}")
+            for label, url, params in (
+                ("GET /inventory/", "/inventory/", None),
+                ("GET /sales/?limit=500", "/sales/", {"limit": 500}),
+            ):
+                r = await measure(client, url, params, headers, args.repeat)
+                print(f"{label:<22}{r['items']:>8}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['peak_mb']:>9.1f}")
+
+    await engine.dispose()
+    await read_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+"""Benchmark: POST /sales/ latency under a mixed load, with and without a read replica.
+
+    python tests/bench_replicas.py --writers 4 --readers 8 --seconds 10 --device-ms 2
+
+Seeds --readers shops with --rows sales each in a throwaway SQLite file, then,
+in-process, --writers clients record sales for shops of their own while
+--readers clients page through GET /sales/ and GET /inventory/. Run twice in
+separate processes: once on the primary alone, once with READ_DATABASE_URL
+pointing at a copy of the file (VACUUM INTO) as the replica. Prints the write
+latency and read throughput of each run.
+
+A replica helps when the database's own capacity is what reads and writes
+compete for; in-process on one machine they only share the app's CPU. So each
+database file gets a simulated device: every --ops SQLite steps on any of its
+connections hold the device for --device-ms. The primary's device is shared by
+its read pool and its writer; the replica has its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def simulate_device(db_engine, lock, args):
+    from sqlalchemy import event
+
+    def busy():
+        with lock:
+            time.sleep(args.device_ms / 1000)
+        return 0
+
+    # The handler runs on the SQLite connection's own thread
+    event.listen(
+        db_engine.sync_engine, "connect",
+        lambda dbapi_conn, record: dbapi_conn.run_async(lambda conn: conn.set_progress_handler(busy, args.ops))
+    )
+
+async def seed(client, args, name):
+    email = f"{name}@example.com"
+    await client.post("/register", json={"name": name, "email": email, "phone": "0300", "password": "password123"})
+    r = await client.post("/token", data={"username": email, "password": "password123"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    r = await client.post("/inventory/", json={"name": f"{name} item", "cost_price": 5, "selling_price": 10, "stock_quantity": 10**9}, headers=headers)
+    product_id = r.json()["id"]
+    for start in range(0, args.rows, 500):
+        batch = [{"product_id": product_id, "quantity": 1}] * min(500, args.rows - start)
+        r = await client.post("/sales/batch", json=batch, headers=headers)
+        r.raise_for_status()
+    return headers, product_id
+
+async def run(args):
+    # Child process: DATABASE_URL (and READ_DATABASE_URL) are already set
+    import httpx
+    from app.main import app
+    from app.database import dispose_engines, shards
+
+    primary, replica = threading.Lock(), threading.Lock()
+    if args.device_ms:
+        simulate_device(shards[0].engine, primary, args)
+        simulate_device(shards[0].read_engine, primary, args)
+        if shards[0].replica_engine is not None:
+            simulate_device(shards[0].replica_engine, replica, args)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            with open(args.tenants) as f:
+                tenants = json.load(f)
+            writers, readers = tenants["writers"], tenants["readers"]
+            write_latencies, reads = [], 0
+            deadline = time.perf_counter() + args.seconds
+
+            async def writer(headers, product_id):
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+                    r.raise_for_status()
+                    write_latencies.append(time.perf_counter() - start)
+
+            async def reader(headers, product_id):
+                nonlocal reads
+                while time.perf_counter() < deadline:
+                    for path in ("/sales/?limit=500", "/inventory/"):
+                        r = await client.get(path, headers=headers)
+                        r.raise_for_status()
+                        reads += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*[writer(*w) for w in writers], *[reader(*r) for r in readers])
+            elapsed = time.perf_counter() - start
+    await dispose_engines()
+    write_latencies.sort()
+    print(json.dumps({
+        "writes_per_second": len(write_latencies) / elapsed,
+        "write_p50_ms": write_latencies[len(write_latencies) // 2] * 1000,
+        "write_p99_ms": write_latencies[int(len(write_latencies) * 0.99)] * 1000,
+        "reads_per_second": reads / elapsed,
+    }))
+
+async def prepare(args, tmp):
+    # Seed once; both runs start from copies of the same file
+    import httpx
+    from app import migrate
+    from app.main import app
+    from app.database import dispose_engines, engine
+
+    await asyncio.to_thread(migrate.upgrade)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            tenants = {
+                "writers": [await seed(client, argparse.Namespace(rows=0), f"writer{i}") for i in range(args.writers)],
+                "readers": [await seed(client, args, f"reader{i}") for i in range(args.readers)],
+            }
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name in ("primary.db", "primary-replicated.db", "replica.db"):
+            await conn.exec_driver_sql(f"VACUUM INTO '{os.path.join(tmp, name)}'")
+    await dispose_engines()
+    with open(os.path.join(tmp, "tenants.json"), "w") as f:
+        json.dump(tenants, f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="sales per reading shop")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--device-ms", type=float, default=2, help="simulated device time per --ops SQLite steps (0: none)")
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--tenants", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.prepare:
+        asyncio.run(prepare(args, os.path.dirname(args.tenants)))
+        return
+    if args.run:
+        asyncio.run(run(args))
+        return
+
+    tmp = tempfile.mkdtemp(prefix="hisabpro-bench-")
+    tenants = os.path.join(tmp, "tenants.json")
+    base_env = {**os.environ, "PAYMENT_WORKER_ENABLED": "false", "DEBUG": "false", "REPORT_CACHE_TTL_SECONDS": "0"}
+    base_env.pop("SHARD_DATABASE_URLS", None)
+    common = [
+        "--writers", str(args.writers), "--readers", str(args.readers), "--rows", str(args.rows),
+        "--seconds", str(args.seconds), "--device-ms", str(args.device_ms), "--ops", str(args.ops), "--tenants", tenants,
+    ]
+    subprocess.run(
+        [sys.executable, __file__, "--prepare", *common],
+        cwd=ROOT, env={**base_env, "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/seed.db"}, check=True
+    )
+
+    runs = {
+        "primary only": {"DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/primary.db"},
+        "with replica": {
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/primary-replicated.db",
+            "READ_DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/replica.db",
+        },
+    }
+    print(f"{'':<14}{'writes/s':>10}{'write p50 ms':>14}{'write p99 ms':>14}{'reads/s':>10}")
+    for name, env in runs.items():
+        out = subprocess.run(
+            [sys.executable, __file__, "--run", *common],
+            cwd=ROOT, env={**base_env, **env}, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{name:<14}{result['writes_per_second']:>10.0f}{result['write_p50_ms']:>14.1f}"
+            f"{result['write_p99_ms']:>14.1f}{result['reads_per_second']:>10.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
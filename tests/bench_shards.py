@@ -0,0 +1,118 @@
+"""Benchmark: sales throughput as tenants are spread over more database shards.
+
+    python tests/bench_shards.py --shards 1,2,4 --tenants 16 --concurrency 32 --seconds 10 --io-ms 10
+
+For every shard count, a fresh run (its own process, so the engines are built
+from that configuration) creates that many throwaway SQLite files, registers
+--tenants shops (spread over the shards by id), and records POST /sales/ from
+--concurrency clients in-process for --seconds. Prints sales per second and
+latency per shard count.
+
+SQLite takes one writer per file, so one file serializes every shop's sales
+and each extra shard adds a writer. That only shows when writing, not Python,
+is the bottleneck: --io-ms adds that much storage time to every sale written,
+inside SQLite's write lock (a slow disk's fsync, a network volume). With
+--io-ms 0 on a machine with few cores, the app's CPU is the limit instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+async def run(args):
+    # Child process: DATABASE_URL and SHARD_DATABASE_URLS are already set
+    import httpx
+    from sqlalchemy import event
+    from app import migrate
+    from app.main import app
+    from app.database import dispose_engines, shards
+
+    await asyncio.to_thread(migrate.upgrade)
+    if args.io_ms:
+        # Runs on the SQLite connection's own thread, holding the write lock
+        def storage_wait():
+            time.sleep(args.io_ms / 1000)
+
+        async def add_trigger(conn):
+            await conn.create_function("bench_storage_wait", 0, storage_wait)
+            await conn.execute("CREATE TEMP TRIGGER bench_io AFTER INSERT ON sales BEGIN SELECT bench_storage_wait(); END")
+
+        for shard in shards:
+            event.listen(shard.engine.sync_engine, "connect", lambda dbapi_conn, record: dbapi_conn.run_async(add_trigger))
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            tenants = []
+            for i in range(args.tenants):
+                email = f"bench{i}@example.com"
+                await client.post("/register", json={"name": "Bench", "email": email, "phone": "0300", "password": "password123"})
+                r = await client.post("/token", data={"username": email, "password": "password123"})
+                headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+                r = await client.post("/inventory/", json={"name": "Bench Item", "cost_price": 5, "selling_price": 10, "stock_quantity": 10**9}, headers=headers)
+                tenants.append((headers, r.json()["id"]))
+
+            latencies = []
+            deadline = time.perf_counter() + args.seconds
+
+            async def worker(n):
+                headers, product_id = tenants[n % len(tenants)]
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+                    r.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*[worker(n) for n in range(args.concurrency)])
+            elapsed = time.perf_counter() - start
+    await dispose_engines()
+    latencies.sort()
+    print(json.dumps({
+        "sales_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--tenants", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--io-ms", type=float, default=10, help="storage time per sale written (0: none)")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        asyncio.run(run(args))
+        return
+
+    print(f"{'shards':>6}  {'sales/s':>9}  {'p50 ms':>8}  {'p99 ms':>8}")
+    baseline = None
+    for count in [int(n) for n in args.shards.split(",")]:
+        tmp = tempfile.mkdtemp(prefix="hisabpro-bench-")
+        urls = [f"sqlite+aiosqlite:///{tmp}/shard{i}.db" for i in range(count)]
+        env = {
+            **os.environ, "DATABASE_URL": urls[0], "SHARD_DATABASE_URLS": ",".join(urls[1:]),
+            "PAYMENT_WORKER_ENABLED": "false", "DEBUG": "false",
+        }
+        out = subprocess.run(
+            [sys.executable, __file__, "--run", "--tenants", str(args.tenants),
+             "--concurrency", str(args.concurrency), "--seconds", str(args.seconds), "--io-ms", str(args.io_ms)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        baseline = baseline or result["sales_per_second"]
+        print(
+            f"{count:>6}  {result['sales_per_second']:>9.0f}  {result['p50_ms']:>8.1f}  {result['p99_ms']:>8.1f}"
+            f"  ({result['sales_per_second'] / baseline:.2f}x)"
+        )
+
+if __name__ == "__main__":
+    main()
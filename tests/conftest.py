@@ -0,0 +1,58 @@
+import os
+import random
+import string
+import tempfile
+import contextlib
+from typing import NamedTuple
+
+# Point the app at a throwaway SQLite file before anything imports app.config
+_TMP_DIR = tempfile.mkdtemp(prefix="hisabpro-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_TMP_DIR}/test.db")
+# Two shards, so every test also runs through the tenant routing
+os.environ.setdefault("SHARD_DATABASE_URLS", f"sqlite+aiosqlite:///{_TMP_DIR}/shard1.db")
+
+import httpx
+import pytest
+
+# The app does no DDL at startup; build the test schema the way a deploy does
+from app import migrate
+migrate.upgrade()
+
+@pytest.fixture
+def api_client():
+    # In-process client against app.main.app (no live server needed).
+    # Usage: async with api_client() as client: ...
+    from app.main import app
+    from app.database import dispose_engines
+
+    @contextlib.asynccontextmanager
+    async def client():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+                yield c
+        # Connections are tied to the event loop of the test that opened them
+        await dispose_engines()
+
+    return client
+
+class TestUser(NamedTuple):
+    id: int
+    token: str
+    headers: dict
+
+@pytest.fixture
+def register_user():
+    # Registers a fresh shop and logs it in.
+    # Usage: user_id, token, headers = await register_user(client)
+    async def register(client, name: str = "Test Shop") -> TestUser:
+        email = f"user_{''.join(random.choices(string.ascii_lowercase, k=10))}@example.com"
+        r = await client.post("/register", json={"name": name, "email": email, "phone": "123", "password": "password123"})
+        assert r.status_code == 200
+        user_id = r.json()["id"]
+        r = await client.post("/token", data={"username": email, "password": "password123"})
+        assert r.status_code == 200
+        token = r.json()["access_token"]
+        return TestUser(user_id, token, {"Authorization": f"Bearer {token}"})
+
+    return register
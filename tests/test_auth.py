@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from app import database
+from app.auth import utils
+from app.config import settings
+
+def test_password_hashing_holds_no_write_connection(api_client, monkeypatch):
+    # SQLite has one write connection; a login holding it through Argon2 would stall every sale
+    held = []
+    run_hasher = utils._run_hasher
+
+    async def watched(func, *args):
+        held.append(database.engine.pool.checkedout())
+        return await run_hasher(func, *args)
+
+    monkeypatch.setattr(utils, "_run_hasher", watched)
+    monkeypatch.setattr(settings, "PAYMENT_WORKER_ENABLED", False) # it polls with the writer at startup
+
+    async def main():
+        async with api_client() as client:
+            r = await client.post("/register", json={"name": "Hash", "email": "hash_writer@example.com", "phone": "1", "password": "password123"})
+            assert r.status_code == 200
+            r = await client.post("/token", data={"username": "hash_writer@example.com", "password": "password123"})
+            assert r.status_code == 200
+            r = await client.post("/token", data={"username": "hash_writer@example.com", "password": "wrong"})
+            assert r.status_code == 401
+            r = await client.post("/register", json={"name": "Hash", "email": "hash_writer@example.com", "phone": "1", "password": "password123"})
+            assert r.status_code == 400
+
+    asyncio.run(main())
+    assert held == [0, 0, 0]
+
+def test_logins_past_the_hasher_queue_are_shed(api_client, register_user, monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_QUEUE", 1)
+
+    class SlowContext:
+        # Holds a hasher slot long enough for the other logins to arrive
+        def __init__(self, context):
+            self.context = context
+
+        def verify_and_update(self, *args):
+            time.sleep(0.2)
+            return self.context.verify_and_update(*args)
+
+        def hash(self, *args):
+            time.sleep(0.2)
+            return self.context.hash(*args)
+
+    async def main():
+        async with api_client() as client:
+            user = await register_user(client)
+            email = (await client.get("/users/me", headers=user.headers)).json()["email"]
+            monkeypatch.setattr(utils, "pwd_context", SlowContext(utils.pwd_context))
+
+            login = {"username": email, "password": "password123"}
+            responses = await asyncio.gather(*[client.post("/token", data=login) for _ in range(5)])
+            statuses = sorted(r.status_code for r in responses)
+            # One hashing, one queued, the rest turned away at once
+            assert statuses == [200, 200, 503, 503, 503]
+            shed = next(r for r in responses if r.status_code == 503)
+            assert shed.headers["retry-after"] == "1"
+
+            # Registration shares the pool
+            logins = [asyncio.create_task(client.post("/token", data=login)) for _ in range(2)]
+            while utils._hash_in_flight < 2:
+                await asyncio.sleep(0.01)
+            r = await client.post("/register", json={"name": "Shed", "email": "shed@example.com", "phone": "1", "password": "password123"})
+            assert r.status_code == 503
+            assert [r.status_code for r in await asyncio.gather(*logins)] == [200, 200]
+
+            # Shed and finished calls both give their slot back
+            assert utils._hash_in_flight == 0
+            assert (await client.post("/token", data=login)).status_code == 200
+
+    asyncio.run(main())
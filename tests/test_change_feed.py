@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from app import change_feed
+from app.change_feed import MemoryChangeFeed
+from app.config import settings
+
+def decode(frames):
+    return [json.loads(frame.removeprefix(b"data: ")) for frame in frames]
+
+def test_broker_fans_out_per_tenant_and_resyncs_slow_readers():
+    async def main():
+        feed = MemoryChangeFeed(max_pending=3)
+        first = await feed.subscribe(1)
+        second = await feed.subscribe(1)
+        other = await feed.subscribe(2)
+
+        await feed.publish(1, {"type": "product.deleted", "product": {"id": 7}})
+        assert decode(await first.next_frames(1)) == [{"type": "product.deleted", "product": {"id": 7}}]
+        assert decode(await second.next_frames(1)) == [{"type": "product.deleted", "product": {"id": 7}}]
+        assert await other.next_frames(0.01) == []
+
+        # A reader that falls behind gets one resync instead of the backlog
+        for i in range(5):
+            await feed.publish(1, {"type": "product.deleted", "product": {"id": i}})
+        assert decode(await first.next_frames(1)) == [{"type": "resync"}]
+        assert await first.next_frames(0.01) == []
+
+        await feed.unsubscribe(first)
+        await feed.unsubscribe(second)
+        await feed.unsubscribe(other)
+        assert feed.stats()["subscribers"] == 0
+
+    asyncio.run(main())
+
+def test_writes_publish_deltas(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            user_id, token, headers = await register_user(client)
+            subscription = await change_feed.subscribe(user_id)
+            try:
+                r = await client.post("/inventory/", json={"name": "Feed Item", "cost_price": 4, "selling_price": 10, "stock_quantity": 5}, headers=headers)
+                product_id = r.json()["id"]
+                await client.put(f"/inventory/{product_id}", json={"name": "Feed Item 2", "cost_price": 4, "selling_price": 10, "stock_quantity": 6}, headers=headers)
+                r = await client.post("/sales/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+                sale_id = r.json()["id"]
+                await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 1}], headers=headers)
+                await client.delete(f"/inventory/{product_id}", headers=headers)
+
+                events = decode(await subscription.next_frames(1))
+            finally:
+                await change_feed.unsubscribe(subscription)
+
+            assert [e["type"] for e in events] == ["product.created", "product.updated", "sale.created", "sale.created", "product.deleted"]
+            assert events[0]["product"] == {"id": product_id, "name": "Feed Item", "cost_price": 4, "selling_price": 10, "stock_quantity": 5}
+            assert events[1]["product"]["name"] == "Feed Item 2"
+            sale = events[2]["sale"]
+            assert sale["id"] == sale_id
+            assert (sale["product_id"], sale["product_name"], sale["quantity_sold"], sale["total_amount"], sale["cost"]) == (product_id, "Feed Item 2", 2, 20, 8)
+            assert events[2]["product"] == {"id": product_id, "stock_quantity": 4}
+            assert events[3]["product"] == {"id": product_id, "stock_quantity": 3}
+            assert events[4] == {"type": "product.deleted", "product": {"id": product_id}}
+
+    asyncio.run(main())
+
+def test_event_stream_endpoint(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            user_id, token, headers = await register_user(client)
+            r = await client.get("/events", params={"token": "not-a-token"})
+            assert r.status_code == 401
+            # The API token doesn't open the stream, and the stream token is no API token
+            r = await client.get("/events", params={"token": token})
+            assert r.status_code == 401
+            r = await client.post("/events/token", headers=headers)
+            assert r.status_code == 200 and r.json()["expires_in"] == settings.EVENTS_TOKEN_EXPIRE_SECONDS
+            events_token = r.json()["token"]
+            r = await client.get("/inventory/", headers={"Authorization": f"Bearer {events_token}"})
+            assert r.status_code == 401
+
+            # httpx's ASGI transport buffers whole responses, so drive the stream by hand
+            from app.main import app
+            sent = asyncio.Queue()
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            scope = {
+                "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+                "method": "GET", "scheme": "http", "path": "/events", "raw_path": b"/events",
+                "query_string": f"token={events_token}".encode(), "root_path": "",
+                "headers": [(b"host", b"test")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+            }
+            stream = asyncio.create_task(app(scope, receive, sent.put))
+
+            start = await sent.get()
+            assert start["status"] == 200
+            assert dict(start["headers"])[b"content-type"].startswith(b"text/event-stream")
+            assert (await sent.get())["body"] == b"retry: 3000\n\n"
+
+            await change_feed.publish(user_id, {"type": "product.deleted", "product": {"id": 1}})
+            assert (await sent.get())["body"] == b'data: {"type":"product.deleted","product":{"id":1}}\n\n'
+
+            disconnected.set()
+            await asyncio.wait_for(stream, 5)
+            assert change_feed.feed_stats()["subscribers"] == 0
+
+    asyncio.run(main())
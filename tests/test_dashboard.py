@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.routers import dashboard
+
+def test_dashboard_etag(api_client, register_user, monkeypatch):
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            r = await client.post("/inventory/", json={"name": "Etag Item", "cost_price": 2, "selling_price": 5, "stock_quantity": 10}, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+            r = await client.get("/dashboard/summary", headers=headers)
+            assert r.status_code == 200
+            etag = r.headers["etag"]
+            assert r.json()["totals"]["revenue"] == 5
+
+            r = await client.get("/dashboard/summary", headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 304 and r.headers["etag"] == etag and not r.content
+
+            # Other query parameters are another representation
+            r = await client.get("/dashboard/summary", params={"days": 7}, headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 200
+
+            # A write bumps the data version
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            r = await client.get("/dashboard/summary", headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 200 and r.headers["etag"] != etag
+            etag = r.headers["etag"]
+
+            # With no writes, tomorrow's window drops a day, so the ETag changes too
+            class Tomorrow(datetime):
+                @classmethod
+                def utcnow(cls):
+                    return datetime.utcnow() + timedelta(days=1)
+
+            monkeypatch.setattr(dashboard, "datetime", Tomorrow)
+            r = await client.get("/dashboard/summary", headers={**headers, "If-None-Match": etag})
+            assert r.status_code == 200 and r.headers["etag"] != etag
+
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+
+from app import export
+
+def test_export_formats_use_sale_time_cost(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            product = {"name": "Export Item", "cost_price": 4, "selling_price": 10, "stock_quantity": 20}
+            r = await client.post("/inventory/", json=product, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+            await client.put(f"/inventory/{product_id}", json={**product, "cost_price": 7}, headers=headers)
+            await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 1}], headers=headers)
+
+            r = await client.get("/sales/export", headers=headers)
+            assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+            rows = list(csv.DictReader(io.StringIO(r.text)))
+            assert [(row["quantity_sold"], row["cost"], row["margin"]) for row in rows] == [("2", "8.0", "12.0"), ("1", "7.0", "3.0")]
+            assert {row["product_name"] for row in rows} == {"Export Item"}
+
+            # The ledger agrees with the P&L report
+            pnl = (await client.get("/reports/pnl", headers=headers)).json()
+            assert sum(float(row["cost"]) for row in rows) == pnl["cost"]
+
+            r = await client.get("/sales/export", params={"format": "ndjson", "gzip": "true"}, headers=headers)
+            assert r.headers["content-type"] == "application/gzip"
+            assert "sales.ndjson.gz" in r.headers["content-disposition"]
+            lines = [json.loads(line) for line in gzip.decompress(r.content).decode().splitlines()]
+            assert [line["id"] for line in lines] == [int(row["id"]) for row in rows]
+            assert list(lines[0]) == export.SALE_FIELDS
+
+            r = await client.get("/sales/export", params={"format": "parquet"}, headers=headers)
+            assert r.status_code == (200 if export.parquet_available() else 501)
+
+    asyncio.run(main())
@@ -3,6 +3,7 @@ import asyncio
 import sys
 import random
 import string
+from app.routers.payment import generate_secure_hash, JC_INTEGRITY_SALT
 
 BASE_URL = "http://127.0.0.1:8000"
 # Use random email to avoid collisions
@@ -44,6 +45,7 @@ async def main():
         r = await client.post("/payment/initiate", json={"amount": 1000.0}, headers=headers)
         txn_ref = r.json()["params"]["pp_TxnRefNo"]
         callback_data = {"pp_ResponseCode": "000", "pp_TxnRefNo": txn_ref, "pp_ResponseMessage": "Success", "pp_Amount": "100000"}
+        callback_data["pp_SecureHash"] = generate_secure_hash(callback_data, JC_INTEGRITY_SALT)
         await client.post("/payment/callback", data=callback_data)
         print("Payment Complete.")
 
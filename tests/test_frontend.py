@@ -0,0 +1,51 @@
+import asyncio
+import re
+
+from app.static_files import IMMUTABLE, REVALIDATE
+
+def test_pages_are_served_precompressed_with_etags(api_client):
+    async def main():
+        async with api_client() as client:
+            plain = await client.get("/dashboard", headers={"Accept-Encoding": "identity"})
+            assert plain.status_code == 200
+            assert "content-encoding" not in plain.headers
+            assert plain.headers["vary"] == "Accept-Encoding"
+            assert plain.headers["cache-control"] == "public, no-cache"
+
+            gzipped = await client.get("/dashboard", headers={"Accept-Encoding": "gzip"})
+            assert gzipped.headers["content-encoding"] == "gzip"
+            assert gzipped.text == plain.text
+            assert int(gzipped.headers["content-length"]) < len(plain.content)
+            # Each encoding is its own representation
+            assert gzipped.headers["etag"] != plain.headers["etag"]
+
+            r = await client.get("/dashboard", headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]})
+            assert r.status_code == 304 and not r.content
+            r = await client.get("/dashboard", headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]})
+            assert r.status_code == 200
+
+            r = await client.get("/dashboard", headers={"Accept-Encoding": "gzip;q=0"})
+            assert "content-encoding" not in r.headers
+
+    asyncio.run(main())
+
+def test_static_assets_are_fingerprinted(api_client):
+    async def main():
+        async with api_client() as client:
+            page = (await client.get("/login")).text
+            css = re.search(r'/static/css/app\.([0-9a-f]{12})\.css', page)
+            assert css is not None
+
+            hashed = await client.get(css.group(0))
+            assert hashed.status_code == 200
+            assert hashed.headers["cache-control"] == IMMUTABLE
+
+            unhashed = await client.get("/static/css/app.css")
+            assert unhashed.headers["cache-control"] == REVALIDATE
+            assert unhashed.content == hashed.content
+            r = await client.get("/static/css/app.css", headers={"If-None-Match": unhashed.headers["etag"]})
+            assert r.status_code == 304
+
+            assert (await client.get("/static/css/app.000000000000.css")).status_code == 404
+
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import metrics
+
+def test_query_timing_survives_failed_statements():
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        metrics.instrument_engine(engine)
+        stats = metrics.RequestStats()
+        token = metrics._request_stats.set(stats)
+        try:
+            async with engine.connect() as conn:
+                for _ in range(3):
+                    with pytest.raises(OperationalError):
+                        await conn.execute(text("SELECT * FROM missing_table"))
+                await conn.execute(text("SELECT 1"))
+                raw = await conn.get_raw_connection()
+                # Nothing is left on the pooled connection by the failed queries
+                assert "query_start" not in raw.info
+        finally:
+            metrics._request_stats.reset(token)
+            await engine.dispose()
+        assert stats.db_queries == 4
+        assert stats.db_seconds > 0
+
+    asyncio.run(main())
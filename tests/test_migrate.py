@@ -0,0 +1,63 @@
+import sqlite3
+
+from app import migrate
+
+# The schema the app created with create_all before migrations existed
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, password_hash VARCHAR, phone VARCHAR, is_paid BOOLEAN);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), name VARCHAR,
+    cost_price FLOAT, selling_price FLOAT, stock_quantity INTEGER
+);
+CREATE TABLE sales (
+    id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), product_id INTEGER REFERENCES products (id),
+    quantity_sold INTEGER, date DATETIME, total_amount FLOAT
+);
+CREATE TABLE payments (
+    id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), amount FLOAT,
+    transaction_id VARCHAR, status VARCHAR, date DATETIME
+);
+"""
+
+def legacy_database(path) -> str:
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO users (id, name, email) VALUES (?, ?, ?)", [(1, "Shop", "a@example.com"), (2, "Other", "b@example.com")])
+    conn.executemany(
+        "INSERT INTO products (id, user_id, name, cost_price, selling_price, stock_quantity) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, 1, "Tea", 2, 5, 10), (2, 1, "Tea", 3, 6, 4), (3, 1, "Tea", 1, 4, 0), (4, 2, "Tea", 2, 5, 1)]
+    )
+    conn.executemany(
+        "INSERT INTO sales (id, user_id, product_id, quantity_sold, date, total_amount) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, 1, 1, 2, "2026-01-05 10:00:00", 10), (2, 1, 2, 1, "2026-01-05 12:00:00", 6), (3, 2, 4, 1, "2026-01-06 09:00:00", 5)]
+    )
+    conn.commit()
+    conn.close()
+    return f"sqlite+aiosqlite:///{path}"
+
+def test_legacy_database_with_duplicate_product_names(tmp_path):
+    path = tmp_path / "legacy.db"
+    migrate.upgrade(legacy_database(path))
+
+    conn = sqlite3.connect(path)
+    # The oldest keeps its name; the others get their id, and their own stock and sales
+    assert conn.execute("SELECT id, user_id, name, stock_quantity FROM products ORDER BY id").fetchall() == [
+        (1, 1, "Tea", 10), (2, 1, "Tea #2", 4), (3, 1, "Tea #3", 0), (4, 2, "Tea", 1)
+    ]
+    assert conn.execute("SELECT id, product_id FROM sales ORDER BY id").fetchall() == [(1, 1), (2, 2), (3, 4)]
+    conn.close()
+
+def test_legacy_database_gets_its_rollups(tmp_path):
+    path = tmp_path / "legacy.db"
+    migrate.upgrade(legacy_database(path))
+
+    # Reports cover the history from the first deploy, with no rebuild_pnl.py run
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT user_id, day, revenue, cost, units_sold, sales_count FROM daily_pnl ORDER BY user_id").fetchall() == [
+        (1, "2026-01-05", 16, 7, 3, 2), (2, "2026-01-06", 5, 2, 1, 1)
+    ]
+    assert conn.execute("SELECT user_id, product_id, revenue, units_sold FROM product_daily_pnl ORDER BY product_id").fetchall() == [
+        (1, 1, 10, 2), (1, 2, 6, 1), (2, 4, 5, 1)
+    ]
+    conn.close()
@@ -0,0 +1,72 @@
+import asyncio
+
+from sqlalchemy import select, func
+
+from app import crud, models, payment_worker
+from app.database import SessionLocal
+from app.routers.payment import generate_secure_hash, JC_INTEGRITY_SALT
+
+class FakeGateway:
+    # Plays JazzCash's side: signs callbacks the way the real gateway does
+    def __init__(self, client):
+        self.client = client
+
+    def callback(self, txn_ref: str, response_code: str = "000", **overrides):
+        data = {
+            "pp_ResponseCode": response_code,
+            "pp_TxnRefNo": txn_ref,
+            "pp_ResponseMessage": "Success" if response_code == "000" else "Failed",
+            "pp_Amount": "100000",
+        }
+        data["pp_SecureHash"] = generate_secure_hash(data, JC_INTEGRITY_SALT)
+        data.update(overrides)
+        return data
+
+    async def send(self, data: dict):
+        return await self.client.post("/payment/callback", data=data)
+
+async def initiate(client, headers):
+    r = await client.post("/payment/initiate", json={"amount": 1000.0}, headers=headers)
+    return r.json()["params"]["pp_TxnRefNo"]
+
+def test_callbacks_are_verified_deduplicated_and_applied(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            gateway = FakeGateway(client)
+            paid_headers = (await register_user(client)).headers
+            failed_headers = (await register_user(client)).headers
+            paid_ref = await initiate(client, paid_headers)
+            failed_ref = await initiate(client, failed_headers)
+
+            # Tampered: signed as a failure, then flipped to success
+            r = await gateway.send(gateway.callback(failed_ref, "999", pp_ResponseCode="000"))
+            assert r.status_code == 400
+
+            # A retry storm: the same signed callback many times, plus a failure for the other txn
+            success = gateway.callback(paid_ref)
+            responses = await asyncio.gather(*[gateway.send(success) for _ in range(10)])
+            assert all(r.status_code == 200 for r in responses)
+            assert (await gateway.send(gateway.callback(failed_ref, "999"))).status_code == 200
+            # A late, conflicting retry for an already-received transaction is ignored
+            assert (await gateway.send(gateway.callback(paid_ref, "999"))).status_code == 200
+
+            await payment_worker.worker.drain()
+
+            assert (await client.get("/users/me", headers=paid_headers)).json()["is_paid"] is True
+            assert (await client.get("/users/me", headers=failed_headers)).json()["is_paid"] is False
+
+            async with SessionLocal() as db:
+                statuses = dict((await db.execute(
+                    select(models.Payment.transaction_id, models.Payment.status)
+                    .where(models.Payment.transaction_id.in_([paid_ref, failed_ref]))
+                )).all())
+                queued = (await db.execute(
+                    select(func.count()).select_from(models.PaymentCallback)
+                    .where(models.PaymentCallback.transaction_id.in_([paid_ref, failed_ref]))
+                )).scalar()
+                # Already applied: processing again changes nothing
+                assert await crud.process_payment_callbacks(db) == (0, [])
+            assert statuses == {paid_ref: "success", failed_ref: "failed"}
+            assert queued == 2
+
+    asyncio.run(main())
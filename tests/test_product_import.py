@@ -0,0 +1,74 @@
+import asyncio
+import csv
+import io
+import json
+
+from app.routers import inventory
+
+def test_import_reports_bad_rows_and_upserts_by_name(api_client, register_user, monkeypatch):
+    monkeypatch.setattr(inventory, "IMPORT_CHUNK_SIZE", 2)
+
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Tapal Tea", "cost_price": 5, "selling_price": 10, "stock_quantity": 3}, headers=headers)
+            tea_id = r.json()["id"]
+
+            body = (
+                "name,cost_price,selling_price,stock_quantity\n"
+                "Tapal Tea,6,12,30\n"
+                "Shan Masala,2,4,10\n"
+                "Broken Row,abc,4,1\n"
+                "Dairy Milk,3,5,7\n"
+                "Dairy Milk,3,6,8\n"
+            )
+            r = await client.post("/inventory/import", files={"file": ("products.csv", body, "text/csv")}, headers=headers)
+            assert r.status_code == 200
+            result = r.json()
+            # The duplicate name in one chunk counts once; the bad row is reported by line
+            assert (result["imported"], result["failed"]) == (3, 1)
+            assert result["errors"][0]["line"] == 4
+            assert result["errors"][0]["errors"][0]["loc"] == ["cost_price"]
+
+            products = {p["name"]: p for p in (await client.get("/inventory/", headers=headers)).json()}
+            assert set(products) == {"Tapal Tea", "Shan Masala", "Dairy Milk"}
+            assert products["Tapal Tea"]["id"] == tea_id
+            assert (products["Tapal Tea"]["selling_price"], products["Tapal Tea"]["stock_quantity"]) == (12, 30)
+            assert products["Dairy Milk"]["selling_price"] == 6
+
+            # NDJSON, picked from the file name; blank lines are skipped
+            body = json.dumps({"name": "Shan Masala", "cost_price": 2, "selling_price": 5, "stock_quantity": 9}) + "\n\n{not json}\n"
+            r = await client.post("/inventory/import", files={"file": ("products.ndjson", body)}, headers=headers)
+            assert (r.json()["imported"], r.json()["failed"], r.json()["errors"][0]["line"]) == (1, 1, 3)
+
+            r = await client.get("/inventory/export", headers=headers)
+            rows = list(csv.DictReader(io.StringIO(r.text)))
+            assert list(rows[0]) == inventory.EXPORT_FIELDS
+            assert {row["name"]: row["stock_quantity"] for row in rows} == {"Tapal Tea": "30", "Shan Masala": "9", "Dairy Milk": "8"}
+
+            r = await client.get("/inventory/export", params={"format": "ndjson"}, headers=headers)
+            assert [json.loads(line)["name"] for line in r.text.splitlines()] == [row["name"] for row in rows]
+
+    asyncio.run(main())
+
+def test_import_reports_a_file_it_cannot_read(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+
+            # Latin-1 from a spreadsheet: rows before the bad byte go in, the line is reported
+            body = b"name,cost_price,selling_price,stock_quantity\nChai,1,2,3\nCaf\xe9,1,2,3\nLater,1,2,3\n"
+            r = await client.post("/inventory/import", files={"file": ("products.csv", body, "text/csv")}, headers=headers)
+            assert r.status_code == 200
+            result = r.json()
+            assert (result["imported"], result["failed"], result["errors"][0]["line"]) == (1, 1, 3)
+            assert result["errors"][0]["errors"][0]["msg"] == "File must be UTF-8 CSV or NDJSON"
+
+            body = "name,cost_price\n".encode("utf-16")
+            r = await client.post("/inventory/import", files={"file": ("products.ndjson", body)}, headers=headers)
+            assert r.status_code == 200 and r.json()["errors"][0]["line"] == 1
+
+            products = (await client.get("/inventory/", headers=headers)).json()
+            assert [p["name"] for p in products] == ["Chai"]
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import asyncio
+
+async def add_product(client, headers, name):
+    r = await client.post("/inventory/", json={"name": name, "cost_price": 5, "selling_price": 10, "stock_quantity": 3}, headers=headers)
+    assert r.status_code == 200
+    return r.json()["id"]
+
+async def search(client, headers, q, limit=20):
+    r = await client.get("/inventory/search", params={"q": q, "limit": limit}, headers=headers)
+    assert r.status_code == 200
+    return [p["name"] for p in r.json()]
+
+def test_search_ranks_prefix_substring_then_fuzzy(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            for name in ("Nestle Chocolate 100g", "Dairy Milk Chocolate", "Chocolate Cookies", "Shan Masala", "Tapal Tea"):
+                await add_product(client, headers, name)
+
+            assert await search(client, headers, "ch") == ["Chocolate Cookies"]
+            assert await search(client, headers, "chocolate") == ["Chocolate Cookies", "Dairy Milk Chocolate", "Nestle Chocolate 100g"]
+            # Typos fall through to trigram similarity
+            assert set(await search(client, headers, "choclate")) == {"Chocolate Cookies", "Dairy Milk Chocolate", "Nestle Chocolate 100g"}
+            assert await search(client, headers, "masla") == ["Shan Masala"]
+            assert await search(client, headers, "zzzz") == []
+            assert await search(client, headers, "chocolate", limit=1) == ["Chocolate Cookies"]
+            # LIKE/FTS syntax in the query is matched literally
+            assert await search(client, headers, '%"') == []
+
+    asyncio.run(main())
+
+def test_search_follows_writes_and_tenants(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            other = (await register_user(client)).headers
+            product_id = await add_product(client, headers, "Lipton Yellow Label")
+            await add_product(client, other, "Lipton Green Tea")
+
+            assert await search(client, headers, "lipton") == ["Lipton Yellow Label"]
+
+            r = await client.put(f"/inventory/{product_id}", json={"name": "Lipton Danedar", "cost_price": 5, "selling_price": 10, "stock_quantity": 3}, headers=headers)
+            assert r.status_code == 200
+            assert await search(client, headers, "yellow") == []
+            assert await search(client, headers, "danedar") == ["Lipton Danedar"]
+
+            r = await client.delete(f"/inventory/{product_id}", headers=headers)
+            assert r.status_code == 200
+            assert await search(client, headers, "lipton") == []
+
+            r = await client.get("/inventory/search", params={"q": ""}, headers=headers)
+            assert r.status_code == 422
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+import dataclasses
+import os
+
+from sqlalchemy.engine import make_url
+
+from app import database, replicas
+from app.config import settings
+
+async def copy_to_replicas(tmp_path):
+    # A snapshot of each shard's file stands in for a lagging replica
+    replica_shards = []
+    for shard in database.shards:
+        path = os.path.join(tmp_path, f"replica{shard.index}.db")
+        async with shard.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql(f"VACUUM INTO '{path}'")
+        url = make_url(shard.url).set(database=path).render_as_string(hide_password=False)
+        replica_shards.append(dataclasses.replace(shard, replica_engine=database._create_replica_engine(url)))
+    return replica_shards
+
+def test_reads_use_replica_except_after_own_write(api_client, monkeypatch, tmp_path, register_user):
+    monkeypatch.setattr(replicas, "recent_writes", replicas.MemoryRecentWrites())
+
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Replica Item", "cost_price": 2, "selling_price": 5, "stock_quantity": 10}, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+            monkeypatch.setattr(database, "shards", await copy_to_replicas(tmp_path))
+            assert "replica" in database.pool_stats()
+            r = await client.post("/sales/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+            assert r.status_code == 200
+
+            # Right after its own write the tenant reads the primary
+            r = await client.get("/sales/", headers=headers)
+            assert [s["quantity_sold"] for s in r.json()] == [2, 1]
+
+            # Once the window has passed, the (stale) replica answers; logins
+            # and the user row still come from the primary
+            monkeypatch.setattr(settings, "READ_AFTER_WRITE_SECONDS", 0)
+            r = await client.get("/sales/", headers=headers)
+            assert [s["quantity_sold"] for s in r.json()] == [1]
+            r = await client.get("/inventory/", headers=headers)
+            assert r.json()[0]["stock_quantity"] == 9
+            assert (await client.get("/users/me", headers=headers)).status_code == 200
+
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+import rebuild_pnl
+from app import report_cache
+from app.config import settings
+
+def test_rollup_rebuild_keeps_sale_time_cost(api_client, register_user, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_CACHE_TTL_SECONDS", 0)
+
+    async def main():
+        async with api_client() as client:
+            user_id, _, headers = await register_user(client)
+            product = {"name": "Rebuilt Item", "cost_price": 4, "selling_price": 10, "stock_quantity": 50}
+            r = await client.post("/inventory/", json=product, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+            await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 1}], headers=headers)
+            await client.post("/sync/sales", json=[{"client_id": "pos-1", "product_id": product_id, "quantity": 1}], headers=headers)
+            await client.put(f"/inventory/{product_id}", json={**product, "cost_price": 10}, headers=headers)
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+            expected = {"revenue": 50, "cost": 4 * 4 + 10 * 1, "profit": 24, "currency": "PKR"}
+            assert (await client.get("/reports/pnl", headers=headers)).json() == expected
+            analytics = (await client.get("/reports/analytics", params={"group_by": "product"}, headers=headers)).json()
+
+            await rebuild_pnl.rebuild_pnl(user_id)
+            assert (await client.get("/reports/pnl", headers=headers)).json() == expected
+            r = await client.get("/reports/analytics", params={"group_by": "product"}, headers=headers)
+            assert r.json() == analytics
+
+    asyncio.run(main())
+
+def test_columnar_report_uses_sale_time_cost(api_client, register_user):
+    pytest.importorskip("numpy")
+
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            product = {"name": "Columnar Item", "cost_price": 3, "selling_price": 10, "stock_quantity": 20}
+            r = await client.post("/inventory/", json=product, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 2}] * 2, headers=headers)
+            await client.put(f"/inventory/{product_id}", json={**product, "cost_price": 8}, headers=headers)
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+            report = (await client.get("/reports/columnar", headers=headers)).json()
+            daily = (await client.get("/reports/daily", headers=headers)).json()
+            assert report["revenue"] == [row["revenue"] for row in daily] == [50]
+            assert report["cost"] == [row["cost"] for row in daily] == [3 * 4 + 8 * 1]
+            assert report["units_sold"] == [5]
+            # The basket is one timestamp with 4 units, the single sale another with 1
+            assert report["basket_size_percentiles"]["p50"] == 2.5
+
+    asyncio.run(main())
+
+def test_report_cache_is_invalidated_by_the_tenants_writes(api_client, register_user, monkeypatch):
+    cache = report_cache.MemoryReportCache(max_entries=100, max_bytes=1 << 20)
+    monkeypatch.setattr(report_cache, "report_cache", cache)
+    monkeypatch.setattr(settings, "REPORT_CACHE_TTL_SECONDS", 60)
+
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            _, _, other = await register_user(client)
+            product = {"name": "Cached Item", "cost_price": 2, "selling_price": 5, "stock_quantity": 50}
+            product_id = (await client.post("/inventory/", json=product, headers=headers)).json()["id"]
+
+            async def revenue(h):
+                return (await client.get("/reports/pnl", headers=h)).json()["revenue"]
+
+            assert await revenue(headers) == 0
+            assert await revenue(other) == 0
+            misses = cache.misses
+            assert await revenue(headers) == 0
+            assert (cache.hits, cache.misses) == (1, misses)
+
+            writes = [
+                ("post", "/sales/", {"product_id": product_id, "quantity": 1}, 5),
+                ("post", "/sales/batch", [{"product_id": product_id, "quantity": 2}], 15),
+                ("post", "/sync/sales", [{"client_id": "pos-1", "product_id": product_id, "quantity": 1}], 20),
+            ]
+            for method, path, body, expected in writes:
+                assert (await getattr(client, method)(path, json=body, headers=headers)).status_code == 200
+                misses = cache.misses
+                assert await revenue(headers) == expected
+                assert cache.misses == misses + 1
+
+            # A product edit moves no revenue but still drops the tenant's reports
+            await client.put(f"/inventory/{product_id}", json={**product, "cost_price": 3}, headers=headers)
+            misses = cache.misses
+            assert await revenue(headers) == 20
+            assert cache.misses == misses + 1
+
+            # Another tenant's cached report survives all of it
+            hits = cache.hits
+            assert await revenue(other) == 0
+            assert cache.hits == hits + 1
+
+    asyncio.run(main())
+
+def test_analytics_buckets_by_local_day_week_and_month(api_client, register_user, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_CACHE_TTL_SECONDS", 0)
+
+    async def main():
+        async with api_client() as client:
+            user_id, _, headers = await register_user(client)
+            product = {"name": "Bucketed Item", "cost_price": 4, "selling_price": 10, "stock_quantity": 50}
+            product_id = (await client.post("/inventory/", json=product, headers=headers)).json()["id"]
+            # UTC timestamps; Asia/Karachi is UTC+5, so three of them land on the next local day
+            sales = [
+                ("2026-02-28T10:00:00", 4), # Sat 28 Feb local
+                ("2026-02-28T19:30:00", 3), # Sun 1 Mar local, still February in UTC
+                ("2026-03-01T18:00:00", 2), # Sun 1 Mar local
+                ("2026-03-01T20:30:00", 1), # Mon 2 Mar local, a new week
+            ]
+            body = [{"client_id": f"bucket-{i}", "product_id": product_id, "quantity": q, "sold_at": at} for i, (at, q) in enumerate(sales)]
+            assert (await client.post("/sync/sales", json=body, headers=headers)).status_code == 200
+
+            async def analytics(**params):
+                r = await client.get("/reports/analytics", params=params, headers=headers)
+                assert r.status_code == 200
+                return [(row["period"], row["revenue"], row["units_sold"]) for row in r.json()]
+
+            expected = {
+                "day": [("2026-02-28", 40, 4), ("2026-03-01", 50, 5), ("2026-03-02", 10, 1)],
+                "week": [("2026-02-23", 90, 9), ("2026-03-02", 10, 1)],
+                "month": [("2026-02-01", 40, 4), ("2026-03-01", 60, 6)],
+            }
+            for granularity, rows in expected.items():
+                assert await analytics(granularity=granularity) == rows
+
+            # start/end are inclusive local dates
+            assert await analytics(start="2026-03-01", end="2026-03-01") == [("2026-03-01", 50, 5)]
+            r = await client.get("/reports/analytics", params={"tz": "UTC"}, headers=headers)
+            assert r.status_code == 400
+
+            # Rebuilding the rollup from the sales buckets them the same way
+            await rebuild_pnl.rebuild_pnl(user_id)
+            for granularity, rows in expected.items():
+                assert await analytics(granularity=granularity) == rows
+
+    asyncio.run(main())
+
+def test_report_cache_versions_are_bounded():
+    async def main():
+        cache = report_cache.MemoryReportCache(max_entries=2, max_bytes=1 << 20)
+        await cache.set((1, await cache.get_version(1), "pnl", ()), {"revenue": 1}, 60)
+        await cache.bump_version(2)
+        await cache.set((2, await cache.get_version(2), "pnl", ()), {"revenue": 2}, 60)
+        for user_id in (3, 4, 5):
+            await cache.bump_version(user_id)
+        assert len(cache._versions) == 2
+
+        # Tenants whose version was dropped never get a stale report back
+        assert await cache.get((1, await cache.get_version(1), "pnl", ())) is None
+        assert await cache.get((2, await cache.get_version(2), "pnl", ())) is None
+
+    asyncio.run(main())
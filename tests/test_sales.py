@@ -0,0 +1,95 @@
+import asyncio
+
+from app.routers import sales
+
+def test_sales_cursor_pages_through_same_timestamp(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            r = await client.post("/inventory/", json={"name": "Paged Item", "cost_price": 1, "selling_price": 2, "stock_quantity": 100}, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            # One batch: seven sales sharing a single timestamp, so pages split on the id tiebreak
+            r = await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": q} for q in range(2, 9)], headers=headers)
+            batch = r.json()
+            assert len({s["date"] for s in batch}) == 1
+
+            seen, cursor = [], None
+            while True:
+                r = await client.get("/sales/", params={"limit": 3, **({"cursor": cursor} if cursor else {})}, headers=headers)
+                assert r.status_code == 200
+                seen += r.json()
+                cursor = r.headers.get("x-next-cursor")
+                if not cursor:
+                    break
+
+            # Every sale exactly once, newest first, ties in descending id
+            assert [s["quantity_sold"] for s in seen] == [8, 7, 6, 5, 4, 3, 2, 1]
+            assert len({s["id"] for s in seen}) == 8
+            ties = [s["id"] for s in seen[:7]]
+            assert ties == sorted(ties, reverse=True)
+
+            r = await client.get("/sales/", params={"cursor": "not-a-cursor"}, headers=headers)
+            assert r.status_code == 400
+
+    asyncio.run(main())
+
+def test_basket_is_all_or_nothing(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            ids = []
+            for name, stock in (("Basket A", 5), ("Basket B", 2)):
+                r = await client.post("/inventory/", json={"name": name, "cost_price": 1, "selling_price": 3, "stock_quantity": stock}, headers=headers)
+                ids.append(r.json()["id"])
+            a, b = ids
+
+            async def stock():
+                return {p["id"]: p["stock_quantity"] for p in (await client.get("/inventory/", headers=headers)).json()}
+
+            # Lines for the same product add up: the third line asks for the 6th unit of A
+            r = await client.post("/sales/batch", json=[{"product_id": a, "quantity": 2}, {"product_id": b, "quantity": 1}, {"product_id": a, "quantity": 4}], headers=headers)
+            assert r.status_code == 400
+            assert r.json()["detail"] == {"line": 2, "product_id": a, "error": "Insufficient stock"}
+
+            r = await client.post("/sales/batch", json=[{"product_id": a, "quantity": 1}, {"product_id": 10**9, "quantity": 1}], headers=headers)
+            assert r.status_code == 400
+            assert r.json()["detail"] == {"line": 1, "product_id": 10**9, "error": "Product not found or not owned by user"}
+
+            assert (await client.post("/sales/batch", json=[], headers=headers)).status_code == 400
+
+            # Nothing from the failed baskets was sold
+            assert await stock() == {a: 5, b: 2}
+            assert (await client.get("/sales/", headers=headers)).json() == []
+            assert (await client.get("/reports/pnl", headers=headers)).json()["revenue"] == 0
+
+            r = await client.post("/sales/batch", json=[{"product_id": a, "quantity": 5}, {"product_id": b, "quantity": 2}], headers=headers)
+            assert r.status_code == 200
+            assert [(s["product_name"], s["quantity_sold"]) for s in r.json()] == [("Basket A", 5), ("Basket B", 2)]
+            assert await stock() == {a: 0, b: 0}
+            assert (await client.get("/reports/pnl", headers=headers)).json()["revenue"] == 21
+
+    asyncio.run(main())
+
+def test_basket_rejects_non_positive_quantities(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            _, _, headers = await register_user(client)
+            r = await client.post("/inventory/", json={"name": "Guarded Item", "cost_price": 1, "selling_price": 2, "stock_quantity": 5}, headers=headers)
+            product_id = r.json()["id"]
+
+            # A negative line must not offset a later one past the stock check
+            r = await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": -100}, {"product_id": product_id, "quantity": 105}], headers=headers)
+            assert r.status_code == 422
+            r = await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 0}], headers=headers)
+            assert r.status_code == 422
+            r = await client.post("/sales/", json={"product_id": product_id, "quantity": 0}, headers=headers)
+            assert r.status_code == 422
+            r = await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 1}] * (sales.MAX_BASKET_LINES + 1), headers=headers)
+            assert r.status_code == 422
+
+            products = (await client.get("/inventory/", headers=headers)).json()
+            assert [p["stock_quantity"] for p in products] == [5]
+            assert (await client.get("/sales/", headers=headers)).json() == []
+
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from sqlalchemy import func, select
+
+from app import database, models, shards, tenant_move
+from app.config import settings
+
+async def count_rows(shard: int, model, user_id: int) -> int:
+    async with database.shards[shard].engine.connect() as conn:
+        result = await conn.execute(select(func.count()).select_from(model).where(model.user_id == user_id))
+        return result.scalar_one()
+
+async def placement(user_id: int) -> int:
+    async with database.ReadSessionLocal() as db:
+        return (await shards.lookup(db, user_id, cached=False)).shard
+
+async def seed(client, headers, name):
+    r = await client.post("/inventory/", json={"name": name, "cost_price": 2, "selling_price": 5, "stock_quantity": 10}, headers=headers)
+    product_id = r.json()["id"]
+    r = await client.post("/sales/", json={"product_id": product_id, "quantity": 3}, headers=headers)
+    return product_id, r.json()["id"]
+
+def test_tenants_are_routed_to_their_shard(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            tenants = [await register_user(client) for _ in range(2)]
+            assert {tenant.id % 2 for tenant in tenants} == {0, 1}
+            for user_id, _, headers in tenants:
+                shard = await placement(user_id)
+                product_id, sale_id = await seed(client, headers, f"Item {user_id}")
+                # Each shard hands out ids from its own range
+                assert product_id // database.SHARD_ID_SPAN == shard
+                assert sale_id // database.SHARD_ID_SPAN == shard
+                assert await count_rows(shard, models.Sale, user_id) == 1
+                assert await count_rows(1 - shard, models.Sale, user_id) == 0
+
+                r = await client.get("/inventory/", headers=headers)
+                assert [p["id"] for p in r.json()] == [product_id]
+                r = await client.get("/reports/pnl", headers=headers)
+                assert r.json()["revenue"] == 15
+
+    asyncio.run(main())
+
+def test_move_tenant_between_shards(api_client, monkeypatch, register_user):
+    monkeypatch.setattr(settings, "SHARD_MAP_CACHE_TTL_SECONDS", 0)
+
+    async def main():
+        async with api_client() as client:
+            user_id, _, headers = await register_user(client)
+            source = await placement(user_id)
+            product_id, sale_id = await seed(client, headers, "Moving Item")
+            r = await client.post("/inventory/", json={"name": "Gone", "cost_price": 1, "selling_price": 1, "stock_quantity": 1}, headers=headers)
+            await client.delete(f"/inventory/{r.json()['id']}", headers=headers)
+            before = {path: (await client.get(path, headers=headers)).json() for path in ("/inventory/", "/sales/", "/reports/daily", "/sync")}
+
+            # While frozen, reads carry on and writes are turned away
+            await tenant_move._set_placement(user_id, source, shards.MOVING)
+            assert (await client.get("/inventory/", headers=headers)).status_code == 200
+            r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            assert r.status_code == 503 and r.headers["retry-after"]
+            await tenant_move._set_placement(user_id, source, shards.ACTIVE)
+
+            report = await tenant_move.move_tenant(user_id, 1 - source, grace_seconds=0)
+            assert report["rows"]["sales"] == 1 and report["rows"]["product_tombstones"] == 1
+            assert await placement(user_id) == 1 - source
+            assert await count_rows(source, models.Sale, user_id) == 0
+            assert await count_rows(source, models.Product, user_id) == 0
+
+            # Same data and ids from the new shard, and it takes writes
+            after = {path: (await client.get(path, headers=headers)).json() for path in before}
+            assert after == before
+            r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+            assert r.status_code == 200
+            assert await count_rows(1 - source, models.Sale, user_id) == 2
+
+            r = await client.get("/inventory/search", params={"q": "moving"}, headers=headers)
+            assert [p["id"] for p in r.json()] == [product_id]
+
+    asyncio.run(main())
+
+def test_reports_for_tenants_on_a_higher_shard(api_client, register_user):
+    # Ids there start at SHARD_ID_SPAN; nothing may size an array by them
+    pytest.importorskip("numpy")
+
+    async def main():
+        async with api_client() as client:
+            user_id, _, headers = await register_user(client)
+            while await placement(user_id) == 0:
+                user_id, _, headers = await register_user(client)
+            product_id, sale_id = await seed(client, headers, "Far Item")
+            assert product_id >= database.SHARD_ID_SPAN and sale_id >= database.SHARD_ID_SPAN
+
+            r = await client.get("/reports/columnar", headers=headers)
+            assert r.status_code == 200
+            assert r.json()["revenue"] == [15] and r.json()["cost"] == [6]
+            r = await client.get("/reports/analytics", params={"group_by": "product"}, headers=headers)
+            assert [row["product_id"] for row in r.json()] == [product_id]
+
+    asyncio.run(main())
+
+def test_product_deleted_during_a_move(api_client, monkeypatch, register_user):
+    monkeypatch.setattr(settings, "SHARD_MAP_CACHE_TTL_SECONDS", 0)
+
+    async def main():
+        async with api_client() as client:
+            user_id, _, headers = await register_user(client)
+            source = await placement(user_id)
+            product_id, sale_id = await seed(client, headers, "Mid Move")
+
+            # Deleted after the first copy, so only the catch-up can bring it over
+            catch_up = tenant_move._catch_up
+            async def delete_then_catch_up(*args):
+                if not deleted:
+                    r = await client.delete(f"/inventory/{product_id}", headers=headers)
+                    deleted.append(r.status_code)
+                return await catch_up(*args)
+            deleted = []
+            monkeypatch.setattr(tenant_move, "_catch_up", delete_then_catch_up)
+
+            report = await tenant_move.move_tenant(user_id, 1 - source, grace_seconds=0)
+            assert deleted == [200]
+            assert report["rows"]["products"] == 0 and report["rows"]["sales"] == 1
+            assert await placement(user_id) == 1 - source
+            r = await client.get("/sync", headers=headers)
+            body = r.json()
+            assert body["deleted_products"] == [product_id]
+            assert [dict(zip(body["sales"]["columns"], row))["product_id"] for row in body["sales"]["rows"]] == [None]
+
+    asyncio.run(main())
+
+def test_failed_registration_leaves_no_user_row_on_a_shard(api_client, monkeypatch):
+    from app import crud, schemas
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async def users_on(shard: int) -> int:
+        async with database.shards[shard].engine.connect() as conn:
+            return (await conn.execute(select(func.count()).select_from(models.User))).scalar_one()
+
+    async def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    async def main():
+        async with api_client():
+            before = [await users_on(shard) for shard in range(len(database.shards))]
+            monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+            # Whichever shard the new id maps to, nothing is written there before the commit
+            async with database.SessionLocal() as db:
+                user = schemas.UserCreate(name="Lost", email="lost@example.com", phone="1", password="password123")
+                with pytest.raises(RuntimeError):
+                    await crud.create_user(db, user)
+            monkeypatch.undo()
+            assert [await users_on(shard) for shard in range(len(database.shards))] == before
+
+    asyncio.run(main())
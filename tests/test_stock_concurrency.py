@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+SELLERS = 20
+SALES_PER_SELLER = 10
+INITIAL_STOCK = 150
+
+async def sell(client, headers, product_id, count):
+    statuses = []
+    for _ in range(count):
+        r = await client.post("/sales/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+        statuses.append(r.status_code)
+    return statuses
+
+async def run_sellers(client, headers, product_id, sellers):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[sell(client, headers, product_id, SALES_PER_SELLER) for _ in range(sellers)])
+    elapsed = time.perf_counter() - start
+    return [s for statuses in results for s in statuses], elapsed
+
+def test_parallel_sellers_never_oversell(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Hot Item", "cost_price": 5, "selling_price": 10, "stock_quantity": INITIAL_STOCK}, headers=headers)
+            product_id = r.json()["id"]
+
+            # More demand (SELLERS * SALES_PER_SELLER) than stock
+            statuses, _ = await run_sellers(client, headers, product_id, SELLERS)
+            sold = statuses.count(200)
+            rejected = statuses.count(400)
+
+            assert sold + rejected == len(statuses)
+            assert sold == INITIAL_STOCK
+
+            products = (await client.get("/inventory/", headers=headers)).json()
+            stock = next(p["stock_quantity"] for p in products if p["id"] == product_id)
+            assert stock == 0
+
+            pnl = (await client.get("/reports/pnl", headers=headers)).json()
+            assert pnl["revenue"] == sold * 10
+
+    asyncio.run(main())
+
+def test_seller_throughput(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Bulk Item", "cost_price": 5, "selling_price": 10, "stock_quantity": 100000}, headers=headers)
+            product_id = r.json()["id"]
+
+            rates = {}
+            for sellers in (1, 4, 16):
+                statuses, elapsed = await run_sellers(client, headers, product_id, sellers)
+                assert statuses.count(200) == len(statuses)
+                rates[sellers] = len(statuses) / elapsed
+
+            # SQLite has one writer, so sales can't scale with sellers, but contention
+            # on the same stock row must not cost throughput either (retries, lock
+            # waits). Half the single-seller rate leaves room for a noisy machine.
+            for sellers in (4, 16):
+                assert rates[sellers] >= 0.5 * rates[1], rates
+
+            products = (await client.get("/inventory/", headers=headers)).json()
+            stock = next(p["stock_quantity"] for p in products if p["id"] == product_id)
+            assert stock == 100000 - (1 + 4 + 16) * SALES_PER_SELLER
+
+    asyncio.run(main())
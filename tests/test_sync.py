@@ -0,0 +1,131 @@
+import asyncio
+
+async def sync_all(client, headers, since="0", limit=500):
+    # Follow `next` until the server has nothing more, as a client would
+    products, deleted, sales, pages = {}, set(), {}, 0
+    while True:
+        r = await client.get("/sync", params={"since": since, "limit": limit}, headers=headers)
+        assert r.status_code == 200
+        body = r.json()
+        pages += 1
+        for row in body["products"]["rows"]:
+            product = dict(zip(body["products"]["columns"], row))
+            products[product["id"]] = product
+            deleted.discard(product["id"])
+        for product_id in body["deleted_products"]:
+            products.pop(product_id, None)
+            deleted.add(product_id)
+        for row in body["sales"]["rows"]:
+            sale = dict(zip(body["sales"]["columns"], row))
+            sales[sale["id"]] = sale
+        since = body["next"]
+        if not body["more"]:
+            return since, products, deleted, sales, pages
+
+def test_sync_returns_only_changes(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            ids = []
+            for i in range(5):
+                r = await client.post("/inventory/", json={"name": f"Sync {i}", "cost_price": 1, "selling_price": 2, "stock_quantity": 10}, headers=headers)
+                ids.append(r.json()["id"])
+            await client.post("/sales/batch", json=[{"product_id": ids[0], "quantity": 1}, {"product_id": ids[1], "quantity": 2}], headers=headers)
+
+            # Small pages split a version part way through and still add up
+            version, products, deleted, sales, pages = await sync_all(client, headers, limit=2)
+            assert pages > 3
+            assert sorted(products) == ids and not deleted and len(sales) == 2
+            assert products[ids[1]]["stock_quantity"] == 8
+
+            r = await client.get("/sync", params={"since": version}, headers=headers)
+            assert r.json()["products"]["rows"] == [] and r.json()["next"] == version
+
+            await client.put(f"/inventory/{ids[2]}", json={"name": "Sync 2b", "cost_price": 1, "selling_price": 3, "stock_quantity": 10}, headers=headers)
+            await client.delete(f"/inventory/{ids[3]}", headers=headers)
+            _, products, deleted, sales, _ = await sync_all(client, headers, since=version)
+            assert list(products) == [ids[2]] and products[ids[2]]["name"] == "Sync 2b"
+            assert deleted == {ids[3]} and sales == {}
+
+            r = await client.get("/sync", params={"since": "x"}, headers=headers)
+            assert r.status_code == 400
+
+    asyncio.run(main())
+
+def test_offline_sales_upload_is_idempotent(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Offline Item", "cost_price": 3, "selling_price": 5, "stock_quantity": 4}, headers=headers)
+            product_id = r.json()["id"]
+            version, *_ = await sync_all(client, headers)
+
+            upload = [
+                {"client_id": "dev1-1", "product_id": product_id, "quantity": 2, "sold_at": "2026-01-02T10:00:00Z"},
+                {"client_id": "dev1-2", "product_id": product_id, "quantity": 3},
+                {"client_id": "dev1-3", "product_id": 999999, "quantity": 1},
+                {"client_id": "dev1-1", "product_id": product_id, "quantity": 2},
+            ]
+            r = await client.post("/sync/sales", json=upload, headers=headers)
+            assert r.status_code == 200
+            results = r.json()
+            assert [(x["client_id"], x["status"]) for x in results] == [
+                ("dev1-1", "created"), ("dev1-2", "rejected"), ("dev1-3", "rejected"), ("dev1-1", "duplicate")
+            ]
+            assert results[1]["error"] == "Insufficient stock"
+            assert results[3]["sale_id"] == results[0]["sale_id"]
+
+            # The retry records nothing twice
+            r = await client.post("/sync/sales", json=upload[:1], headers=headers)
+            assert r.json() == [{"client_id": "dev1-1", "status": "duplicate", "sale_id": results[0]["sale_id"], "error": None}]
+
+            _, products, _, sales, _ = await sync_all(client, headers, since=version)
+            assert products[product_id]["stock_quantity"] == 2
+            assert list(sales) == [results[0]["sale_id"]]
+            sale = sales[results[0]["sale_id"]]
+            assert sale["client_id"] == "dev1-1" and sale["date"].startswith("2026-01-02T10:00:00")
+
+    asyncio.run(main())
+
+def test_product_delete_reaches_delta_sync(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Short Lived", "cost_price": 1, "selling_price": 2, "stock_quantity": 10}, headers=headers)
+            product_id = r.json()["id"]
+            await client.post("/sales/batch", json=[{"product_id": product_id, "quantity": 1}, {"product_id": product_id, "quantity": 2}], headers=headers)
+            version, products, _, sales, _ = await sync_all(client, headers)
+            assert all(sale["product_id"] == product_id for sale in sales.values())
+
+            # The sales lose their product, and a client on deltas hears about it
+            await client.delete(f"/inventory/{product_id}", headers=headers)
+            _, delta_products, delta_deleted, delta_sales, _ = await sync_all(client, headers, since=version)
+            assert delta_deleted == {product_id} and sorted(delta_sales) == sorted(sales)
+            for product_id in delta_deleted:
+                products.pop(product_id, None)
+            products.update(delta_products)
+            sales.update(delta_sales)
+
+            _, full_products, _, full_sales, _ = await sync_all(client, headers)
+            assert products == full_products and sales == full_sales
+            assert all(sale["product_id"] is None for sale in full_sales.values())
+
+    asyncio.run(main())
+
+def test_deleted_product_id_is_not_handed_out_again(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = (await register_user(client)).headers
+            r = await client.post("/inventory/", json={"name": "Old Stock", "cost_price": 1, "selling_price": 4, "stock_quantity": 5}, headers=headers)
+            old_id = r.json()["id"]
+            await client.post("/sales/", json={"product_id": old_id, "quantity": 2}, headers=headers)
+            await client.delete(f"/inventory/{old_id}", headers=headers)
+
+            # The newest product was deleted; its successor must not take its id
+            r = await client.post("/inventory/", json={"name": "New Stock", "cost_price": 1, "selling_price": 4, "stock_quantity": 5}, headers=headers)
+            assert r.json()["id"] > old_id
+
+            r = await client.get("/reports/analytics", params={"group_by": "product"}, headers=headers)
+            assert [(row["product_id"], row["product_name"]) for row in r.json()] == [(old_id, "Unknown")]
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import asyncio
+import multiprocessing
+import random
+
+from app.routers.payment import INITIATE_HASH, JC_INTEGRITY_SALT, STATIC_PARAMS, generate_secure_hash
+from app.txn_ref import new_txn_ref
+
+INITIATIONS = 2000
+USERS = 5
+
+def _refs_from_child(count, queue):
+    queue.put([new_txn_ref() for _ in range(count)])
+
+def test_refs_are_unique_and_sorted_across_processes():
+    # Forked after the parent has generated refs, like gunicorn workers with preload_app
+    parent = [new_txn_ref() for _ in range(10000)]
+    assert parent == sorted(parent)
+    assert all(len(ref) == 20 for ref in parent)
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    children = [ctx.Process(target=_refs_from_child, args=(20000, queue)) for _ in range(4)]
+    for child in children:
+        child.start()
+    refs = [ref for _ in children for ref in queue.get()]
+    for child in children:
+        child.join()
+
+    refs += parent
+    assert len(set(refs)) == len(refs)
+
+def test_hash_template_matches_generate_secure_hash():
+    for _ in range(200):
+        variable = {
+            "pp_TxnRefNo": new_txn_ref(),
+            "pp_Amount": random.choice(["", f"{random.uniform(1, 100000):.2f}"]),
+            "pp_TxnDateTime": "20260101120000",
+            "pp_TxnExpiryDateTime": "20260101130000",
+        }
+        params = {**STATIC_PARAMS, **variable, "pp_SecureHash": ""}
+        assert INITIATE_HASH.sign(variable) == generate_secure_hash(params, JC_INTEGRITY_SALT)
+
+def test_concurrent_initiations_never_collide(api_client, register_user):
+    async def main():
+        async with api_client() as client:
+            headers = []
+            for _ in range(USERS):
+                headers.append((await register_user(client)).headers)
+
+            responses = await asyncio.gather(*[
+                client.post("/payment/initiate", json={"amount": 1000.0}, headers=headers[i % USERS])
+                for i in range(INITIATIONS)
+            ])
+            assert [r.status_code for r in responses] == [200] * INITIATIONS
+            refs = [r.json()["params"]["pp_TxnRefNo"] for r in responses]
+            assert len(set(refs)) == INITIATIONS
+
+            params = responses[0].json()["params"]
+            assert params["pp_SecureHash"] == generate_secure_hash(params, JC_INTEGRITY_SALT)
+
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+import asyncio
+
+from sqlalchemy import event
+
+from app import database, payment_worker
+from app.auth import user_cache
+from app.config import settings
+from app.routers.payment import generate_secure_hash, JC_INTEGRITY_SALT
+
+def test_cached_user_is_invalidated_when_payment_lands(api_client, register_user, monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENT_REQUIRED", True)
+    monkeypatch.setattr(user_cache, "user_cache", user_cache.MemoryUserCache(max_size=100, ttl_seconds=60))
+    user_selects = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            user_selects.append(statement)
+
+    sync_engine = database.read_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count)
+    try:
+        async def main():
+            async with api_client() as client:
+                _, _, headers = await register_user(client)
+                user_selects.clear()
+
+                # The first request loads the user; later ones are served from the snapshot
+                for _ in range(3):
+                    assert (await client.get("/inventory/", headers=headers)).status_code == 403
+                assert len(user_selects) == 1
+
+                r = await client.post("/payment/initiate", json={"amount": 1000.0}, headers=headers)
+                data = {"pp_ResponseCode": "000", "pp_TxnRefNo": r.json()["params"]["pp_TxnRefNo"], "pp_ResponseMessage": "Success", "pp_Amount": "100000"}
+                data["pp_SecureHash"] = generate_secure_hash(data, JC_INTEGRITY_SALT)
+                assert (await client.post("/payment/callback", data=data)).status_code == 200
+                await payment_worker.worker.drain()
+
+                # Flipping is_paid dropped the stale snapshot: the next request reloads the user
+                user_selects.clear()
+                assert (await client.get("/inventory/", headers=headers)).status_code == 200
+                assert (await client.get("/inventory/", headers=headers)).status_code == 200
+                assert len(user_selects) == 1
+
+        asyncio.run(main())
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)